@@ -8,6 +8,7 @@ import requests as http_requests
 from flask import Flask, Response, jsonify, redirect, render_template, request, send_file, url_for
 
 from pill_dispenser_fsm import PillDispenserFSM
+from realsense_frame_channel import META_CHANNEL_MAX_BYTES, META_CHANNEL_NAME, FrameChannelReader
 
 try:
     import msvcrt  # type: ignore
@@ -27,6 +28,9 @@ REALSENSE_FRAME_FILE = RUNTIME_DIR / "realsense_latest.jpg"
 REALSENSE_META_FILE = RUNTIME_DIR / "realsense_meta.json"
 REALSENSE_META_LOCK_FILE = RUNTIME_DIR / "realsense_meta.lock"
 _LAST_REALSENSE_META_CACHE: dict = {}
+# Shared by every request thread; each reader serialises attach/detach/read internally.
+_REALSENSE_FRAME_CHANNEL = FrameChannelReader()
+_REALSENSE_META_CHANNEL = FrameChannelReader(META_CHANNEL_NAME, max_payload=META_CHANNEL_MAX_BYTES)
 
 SCENE_TEMPLATES = {
     "idle": "Idle Welcome.html",
@@ -98,7 +102,11 @@ def _read_json_file_with_retries(path: Path, *, retries: int = 4, delay_s: float
     last_exc: Exception | None = None
     for attempt in range(max(1, int(retries))):
         try:
-            with _cross_process_file_lock(REALSENSE_META_LOCK_FILE, timeout_s=0.12):
+            if os.name == "nt":
+                with _cross_process_file_lock(REALSENSE_META_LOCK_FILE, timeout_s=0.12):
+                    payload = json.loads(path.read_text(encoding="utf-8"))
+            else:
+                # The writer renames a complete file into place; no lock needed on POSIX.
                 payload = json.loads(path.read_text(encoding="utf-8"))
             return payload if isinstance(payload, dict) else {}
         except TimeoutError as exc:
@@ -191,12 +199,27 @@ def api_users():
 @app.get("/api/realsense/meta")
 def api_realsense_meta():
     global _LAST_REALSENSE_META_CACHE
+    latest = _REALSENSE_META_CHANNEL.read()
+    if latest is not None:
+        try:
+            payload = json.loads(latest[1])
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict):
+            _LAST_REALSENSE_META_CACHE = dict(payload)
+            payload["available"] = True
+            payload["stale"] = False
+            payload["busy"] = False
+            return jsonify(payload)
     if not REALSENSE_META_FILE.exists():
         return jsonify(
             available=False,
             message="No RealSense stream metadata yet. Start face_med_reminder.py first.",
         ), 404
     try:
+        # The file is only rewritten while shared memory is unavailable, so it may be
+        # left over from an earlier run; judge freshness by its age, like the channel does.
+        age_s = time.time() - REALSENSE_META_FILE.stat().st_mtime
         payload = _read_json_file_with_retries(REALSENSE_META_FILE)
     except PermissionError:
         if _LAST_REALSENSE_META_CACHE:
@@ -227,13 +250,20 @@ def api_realsense_meta():
         payload = {}
     _LAST_REALSENSE_META_CACHE = dict(payload)
     payload["available"] = True
-    payload["stale"] = False
+    payload["stale"] = age_s > _REALSENSE_META_CHANNEL.stale_after_s
     payload["busy"] = False
     return jsonify(payload)
 
 
 @app.get("/api/realsense/frame.jpg")
 def api_realsense_frame():
+    latest = _REALSENSE_FRAME_CHANNEL.read()
+    if latest is not None:
+        return Response(
+            latest[1],
+            mimetype="image/jpeg",
+            headers={"Cache-Control": "no-store, no-cache, must-revalidate, max-age=0"},
+        )
     if not REALSENSE_FRAME_FILE.exists():
         return jsonify(
             available=False,
@@ -246,21 +276,30 @@ def api_realsense_frame():
 def api_realsense_stream():
     def generate():
         last_mtime_ns = None
+        last_seq = None
         while True:
             try:
-                if not REALSENSE_FRAME_FILE.exists():
-                    time.sleep(0.15)
-                    continue
-                stat = REALSENSE_FRAME_FILE.stat()
-                mtime_ns = getattr(stat, "st_mtime_ns", None)
-                if mtime_ns is not None and last_mtime_ns == mtime_ns:
-                    time.sleep(0.05)
-                    continue
-                frame_bytes = REALSENSE_FRAME_FILE.read_bytes()
-                if not frame_bytes:
-                    time.sleep(0.05)
-                    continue
-                last_mtime_ns = mtime_ns
+                seq = _REALSENSE_FRAME_CHANNEL.seq()
+                if seq is not None:
+                    latest = _REALSENSE_FRAME_CHANNEL.read() if seq != last_seq else None
+                    if latest is None:
+                        time.sleep(0.05)
+                        continue
+                    last_seq, frame_bytes = latest
+                else:
+                    if not REALSENSE_FRAME_FILE.exists():
+                        time.sleep(0.15)
+                        continue
+                    stat = REALSENSE_FRAME_FILE.stat()
+                    mtime_ns = getattr(stat, "st_mtime_ns", None)
+                    if mtime_ns is not None and last_mtime_ns == mtime_ns:
+                        time.sleep(0.05)
+                        continue
+                    frame_bytes = REALSENSE_FRAME_FILE.read_bytes()
+                    if not frame_bytes:
+                        time.sleep(0.05)
+                        continue
+                    last_mtime_ns = mtime_ns
                 yield (
                     b"--frame\r\n"
                     b"Content-Type: image/jpeg\r\n"
@@ -8,6 +8,16 @@ Requirements:
   pip install pyrealsense2 opencv-python numpy insightface onnxruntime
   # On Jetson (aarch64) with GPU:
   #   pip install --extra-index-url https://pypi.jetson-ai-lab.io/jp6/cu126 onnxruntime-gpu
+  # Optional (faster web-stream JPEG encoding via libjpeg-turbo, faster runtime JSON):
+  #   pip install PyTurboJPEG orjson
+  # Optional (GPU JPEG encoding on CUDA hosts; disable with REALSENSE_GPU_JPEG=0):
+  #   pip install pynvjpeg
+  # With a TensorRT-enabled onnxruntime-gpu, SCRFD/ArcFace run as FP16 TRT engines;
+  #   engines are cached under insightface_models/trt_cache (REALSENSE_TENSORRT=0 disables).
+  # Optional (SIMD cosine kernels for face matching, NEON/SVE on Jetson):
+  #   pip install simsimd
+  # Optional (event-driven user-store reload instead of 1 Hz directory polling):
+  #   pip install watchdog
 
 Usage:
   python face_med_reminder.py
@@ -28,19 +38,65 @@ import cv2
 import numpy as np
 import pyrealsense2 as rs
 import json
+import math
 import os
+import queue
+import threading
 import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
 from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 
+_MODULE_DIR = Path(__file__).resolve().parent
 os.environ["OMP_NUM_THREADS"] = "4"
+cv2.setUseOptimized(True)
 
 import insightface
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
 
 from realsense_fsm_adapter import RealSenseFSMAdapter
-from shared_user_storage import SharedUserStorage
+from realsense_frame_channel import (
+    FRAME_CHANNEL_MAX_JPEG,
+    META_CHANNEL_MAX_BYTES,
+    META_CHANNEL_NAME,
+    FrameChannelWriter,
+)
+from shared_user_storage import SharedUserStorage, write_file_atomic
+
+try:
+    from turbojpeg import TJPF_BGR, TJSAMP_420, TurboJPEG  # type: ignore
+except Exception:  # pragma: no cover - optional libjpeg-turbo binding
+    TurboJPEG = None
+
+try:
+    from nvjpeg import NvJpeg  # type: ignore
+except Exception:  # pragma: no cover - optional CUDA nvJPEG binding
+    NvJpeg = None
+
+try:
+    import simsimd  # type: ignore
+except Exception:  # pragma: no cover - optional SIMD distance kernels
+    simsimd = None
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional fast JSON encoder
+    orjson = None
+
+try:
+    from watchdog.events import FileSystemEventHandler  # type: ignore
+    from watchdog.observers import Observer  # type: ignore
+except Exception:  # pragma: no cover - optional inotify/FSEvents watcher
+    Observer = None
+
+try:
+    import onnxruntime as ort  # type: ignore
+except Exception:  # pragma: no cover - pulled in by insightface; only used to probe providers
+    ort = None
 
 try:
     import msvcrt  # type: ignore
@@ -57,6 +113,7 @@ except Exception:  # pragma: no cover - Windows
 USERS_JSON = os.path.join("data", "users.json")  # legacy compatibility cache
 MAX_USERS = 10
 DETECTION_DISTANCE_M = 0.7        # aligned with FSM / frontend wake threshold (meters)
+MIN_FACE_BBOX_PX = 40             # narrower boxes are too far away to be the subject; skip depth
 
 # --- Recognition thresholds (ArcFace cosine similarity) ---
 # Same person typically > 0.4, different person < 0.2
@@ -69,17 +126,48 @@ CONFIRM_FRAMES_NEEDED = 3          # Need 3 consistent matches
 CONFIRM_WINDOW_FRAMES = 5          # Within last 5 frames
 UNKNOWN_CONFIRM_FRAMES = 5         # Need 5 "unknown" before registration
 
+# --- RealSense streams ---
+# Depth is only sampled around face centers, so a native low-res Z16 mode is enough;
+# rs.align upsamples it into color coordinates. Color stays high-res for SCRFD/ArcFace.
+COLOR_STREAM_SIZE = (848, 480)
+DEPTH_STREAM_SIZE = (480, 270)
+STREAM_FPS = 30
+# Detection is skipped while the central half of the frame has almost nothing nearer than
+# DEPTH_GATE_MAX_M (empty scene / background only). The margin past DETECTION_DISTANCE_M
+# keeps the "move closer" prompt working for someone approaching.
+DEPTH_GATE_MAX_M = 1.2
+DEPTH_GATE_MIN_FRACTION = 0.02     # of the centre ROI; a face at 0.7 m covers roughly 20%
+DEPTH_WINDOW_PX = 5                # median window (color px) around each face centre; depth is pre-smoothed
+
+DETECT_EVERY_N_FRAMES = 3         # full SCRFD+ArcFace pass every Nth frame; boxes are reused in between
+
 RECOGNITION_COOLDOWN_S = 8
 REGISTER_COOLDOWN_S = 5
 
 # InsightFace model: "buffalo_s" (fast) or "buffalo_l" (more accurate)
 INSIGHTFACE_MODEL = "buffalo_s"
+INSIGHTFACE_ROOT = Path("insightface_models")
+# SCRFD input (w, h). Detection runs on the centred square crop of the color frame (the
+# subject stands in front of the dispenser), so a square input wastes no letterbox rows.
+# Both sides must be multiples of 32, the coarsest SCRFD stride.
+DETECTION_SIZE = (256, 256)
+DETECT_CENTER_SQUARE = True
+MAX_DETECTED_FACES = 5             # SCRFD keeps the largest/most central boxes beyond this
+TRT_ENGINE_CACHE_DIR = INSIGHTFACE_ROOT / "trt_cache"
+EMBEDDING_DIM = 512                # ArcFace output size for both buffalo packs
 REALSENSE_RUNTIME_DIR = Path("data") / "runtime"
 REALSENSE_FRAME_FILE = REALSENSE_RUNTIME_DIR / "realsense_latest.jpg"
 REALSENSE_FRAME_META_FILE = REALSENSE_RUNTIME_DIR / "realsense_meta.json"
 REALSENSE_FRAME_META_LOCK_FILE = REALSENSE_RUNTIME_DIR / "realsense_meta.lock"
 REALSENSE_PENDING_EMBED_FILE = REALSENSE_RUNTIME_DIR / "realsense_pending_embedding.json"
-REALSENSE_JPEG_QUALITY = 85
+EMBEDDING_BANK_FILE = REALSENSE_RUNTIME_DIR / "_bank.npy"
+EMBEDDING_BANK_IDS_FILE = REALSENSE_RUNTIME_DIR / "_bank_ids.json"
+
+REALSENSE_JPEG_QUALITY = 70        # preview only; bytes (and encode time) scale roughly with quality
+REALSENSE_JPEG_QUALITY_MIN = 60    # floor when the publisher falls behind
+PUBLISH_FRAME_SIZE = (640, 360)    # web preview (w, h); inference stays at COLOR_STREAM_SIZE
+FRAME_UNCHANGED_MAD = 2.0          # mean abs diff (0-255) of a 32x24 thumbnail below which a frame is "the same"
+FRAME_FORCE_PUBLISH_S = 1.0        # re-encode at least this often; keeps shm readers from marking the writer stale
 
 
 def _env_flag(name: str, default: bool = False) -> bool:
@@ -87,6 +175,43 @@ def _env_flag(name: str, default: bool = False) -> bool:
     return raw in {"1", "true", "yes", "on"}
 
 
+def _onnx_providers():
+    """
+    ONNX Runtime providers for InsightFace, fastest first. TensorRT builds FP16
+    engines on first start (slow, minutes on Orin) and reuses the cache afterwards.
+    """
+    providers = []
+    available = set(ort.get_available_providers()) if ort is not None else set()
+    if "TensorrtExecutionProvider" in available and _env_flag("REALSENSE_TENSORRT", default=True):
+        cache_dir = _MODULE_DIR / TRT_ENGINE_CACHE_DIR
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        providers.append((
+            "TensorrtExecutionProvider",
+            {
+                "trt_fp16_enable": True,
+                "trt_engine_cache_enable": True,
+                "trt_engine_cache_path": str(cache_dir),
+            },
+        ))
+    providers += ["CUDAExecutionProvider", "CPUExecutionProvider"]
+    return providers
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_bytes(payload) -> bytes:
+    """Serialize runtime payloads (numpy arrays allowed) to UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
 @contextmanager
 def _cross_process_file_lock(lock_file: Path, *, timeout_s: float = 0.15, poll_s: float = 0.005):
     lock_file.parent.mkdir(parents=True, exist_ok=True)
@@ -129,52 +254,125 @@ def _cross_process_file_lock(lock_file: Path, *, timeout_s: float = 0.15, poll_s
 
 # ======================= User Data =======================
 
-_SHARED_STORE = SharedUserStorage(Path(__file__).resolve().parent)
+_SHARED_STORE = SharedUserStorage(_MODULE_DIR)
 
 
-def load_users():
+def load_users(include_embeddings=True):
     """
     RealSense compatibility loader backed by canonical per-user storage.
     Returns legacy-shaped payload: {"users": [...]} for minimal code changes below.
     """
     _SHARED_STORE.import_legacy_users_json()
-    return {"users": _SHARED_STORE.list_realsense_users(import_legacy=False)}
+    users = _SHARED_STORE.list_realsense_users(
+        import_legacy=False, include_embeddings=include_embeddings
+    )
+    for u in users:
+        _compile_med_schedule(u)
+    return {"users": users}
 
 
 def save_users(data):
     _SHARED_STORE.save_realsense_users(data if isinstance(data, dict) else {"users": []})
 
 
-def find_matching_user(embedding, data):
+def _quantize_i8(vecs):
+    """Symmetric per-row int8 quantization; returns (q8, scale) with vecs ~= q8 * scale."""
+    vecs = np.atleast_2d(vecs)
+    scale = np.abs(vecs).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q8 = np.round(vecs / scale[:, None]).astype(np.int8)
+    return q8, scale.astype(np.float32)
+
+
+@dataclass(slots=True)
+class FaceGallery:
+    """
+    L2-normalized (N, D) embeddings (float16 as persisted, or float32); row r belongs
+    to users[user_idx[r]]. With quantize=True an int8 copy is kept and used for scoring.
+    """
+    vecs: np.ndarray
+    user_idx: np.ndarray
+    q8: np.ndarray | None = None
+    q8_scale: np.ndarray | None = None
+
+    @classmethod
+    def build(cls, vecs, user_idx, quantize=False):
+        gallery = cls(vecs, np.asarray(user_idx, dtype=np.intp))
+        if quantize:
+            gallery.q8, gallery.q8_scale = _quantize_i8(np.asarray(vecs, dtype=np.float32))
+        return gallery
+
+    def __len__(self):
+        return len(self.vecs)
+
+    def append(self, vec, user_idx):
+        self.vecs = np.vstack([self.vecs, vec[None, :].astype(self.vecs.dtype)])
+        self.user_idx = np.append(self.user_idx, user_idx)
+        if self.q8 is not None:
+            q8, scale = _quantize_i8(vec)
+            self.q8 = np.vstack([self.q8, q8])
+            self.q8_scale = np.append(self.q8_scale, scale)
+
+    def scores(self, query):
+        """Cosine similarity of a normalized query against every row."""
+        if self.q8 is not None:
+            qq, qs = _quantize_i8(query)
+            dots = None
+            if simsimd is not None:
+                try:
+                    dots = np.asarray(simsimd.cdist(qq, self.q8, metric="dot")).ravel()
+                except (TypeError, ValueError):  # build without int8 dot kernels
+                    dots = None
+            if dots is None:
+                dots = self.q8.astype(np.int32) @ qq[0].astype(np.int32)
+            return dots * self.q8_scale * qs[0]
+        if simsimd is not None:
+            # Rows and query are unit-length, so the inner product is the cosine; the "dot"
+            # kernel skips the two norm reductions "cosine" would do per row.
+            q = query[None, :].astype(self.vecs.dtype, copy=False)
+            return np.asarray(simsimd.cdist(q, self.vecs, metric="dot")).ravel()
+        # float16 rows are promoted to float32 for the product; the query stays float32.
+        return self.vecs @ query
+
+
+def find_matching_user(embedding, data, gallery=None):
     """
     Match embedding against stored users via cosine similarity.
+    With a FaceGallery every user is scored in one vectorized call; otherwise
+    each face_encoding is scanned.
     Returns (user_dict, index, score) or (None, -1, best_score).
     """
-    if not data["users"]:
+    users = data["users"]
+    if not users:
         return None, -1, 0.0
 
     query = np.array(embedding, dtype=np.float32).flatten()
     if query.size == 0:
         return None, -1, 0.0
-    query /= (np.linalg.norm(query) + 1e-8)
+    query *= 1.0 / math.sqrt(float(query @ query) + 1e-16)
 
     best_score = -1.0
     best_idx = -1
 
-    for i, u in enumerate(data["users"]):
-        raw_encoding = u.get("face_encoding")
-        if raw_encoding is None:
-            continue
-
-        stored = np.array(raw_encoding, dtype=np.float32).flatten()
-        # Skip incompatible/legacy encodings (e.g., older 128-d vectors).
-        if stored.size != query.size or stored.size == 0:
-            continue
-        stored /= (np.linalg.norm(stored) + 1e-8)
-        score = float(np.dot(query, stored))
-        if score > best_score:
-            best_score = score
-            best_idx = i
+    if gallery is not None and len(gallery) and gallery.vecs.shape[1] == query.size:
+        scores = gallery.scores(query)
+        row = int(scores.argmax())
+        best_score = float(scores[row])
+        best_idx = int(gallery.user_idx[row])
+    else:
+        for i, user in enumerate(users):
+            raw_encoding = user.get("face_encoding")
+            if raw_encoding is None:
+                continue
+
+            stored = np.array(raw_encoding, dtype=np.float32).flatten()
+            # Skip incompatible/legacy encodings (e.g., older 128-d vectors).
+            if stored.size != query.size or stored.size == 0:
+                continue
+            score = float(query @ stored) / math.sqrt(float(stored @ stored) + 1e-16)
+            if score > best_score:
+                best_score = score
+                best_idx = i
 
     if best_idx == -1:
         return None, -1, 0.0
@@ -184,43 +382,65 @@ def find_matching_user(embedding, data):
     return None, -1, best_score
 
 
+def _compile_med_schedule(user):
+    """
+    Pre-parse medication times once per load. user["_sched_min"] holds minute-of-day
+    keys sorted ascending, with the reminder lines for each entry pre-formatted in
+    parallel lists so get_pending_meds only bisects and slices. Unparseable times are skipped.
+    """
+    sched = []
+    for med in user.get("medications", []):
+        for t in med.get("times", []):
+            parts = str(t).split(":")
+            try:
+                h = int(parts[0])
+                m = int(parts[1]) if len(parts) > 1 else 0
+            except ValueError:
+                continue
+            sched.append((h * 60 + m, t, med.get("name", "")))
+    sched.sort(key=lambda entry: entry[0])
+    user["_sched_min"] = [minute for minute, _, _ in sched]
+    user["_sched_now"] = [f"  >>> {t} - {name}  [NOW!]" for _, t, name in sched]
+    user["_sched_upcoming"] = [f"  {t} - {name}  (upcoming)" for _, t, name in sched]
+    user["_sched_full"] = ["  (No medication due soon)", "  Full schedule:"] + [
+        f"    {t} - {name}" for _, t, name in sched
+    ]
+    return user
+
+
 def get_pending_meds(user):
     """Return medication reminders based on current time."""
     now = datetime.now()
     now_min = now.hour * 60 + now.minute
-    reminders = []
-
-    for med in user.get("medications", []):
-        for t in med["times"]:
-            parts = t.split(":")
-            h, m = int(parts[0]), int(parts[1]) if len(parts) > 1 else 0
-            diff = (h * 60 + m) - now_min
-            if abs(diff) <= 30:
-                reminders.append(f"  >>> {t} - {med['name']}  [NOW!]")
-            elif 0 < diff <= 120:
-                reminders.append(f"  {t} - {med['name']}  (upcoming)")
-
-    if not reminders:
-        reminders.append("  (No medication due soon)")
-        reminders.append("  Full schedule:")
-        for med in user.get("medications", []):
-            for t in med["times"]:
-                reminders.append(f"    {t} - {med['name']}")
-    return reminders
+    if user.get("_sched_min") is None:
+        _compile_med_schedule(user)
+    minutes = user["_sched_min"]
+    lo = bisect_left(minutes, now_min - 30)
+    mid = bisect_right(minutes, now_min + 30, lo)
+    hi = bisect_right(minutes, now_min + 120, mid)
+    reminders = user["_sched_now"][lo:mid] + user["_sched_upcoming"][mid:hi]
+    return reminders if reminders else list(user["_sched_full"])
 
 
 # ======================= Depth Helper =======================
 
-def median_depth_at(depth_frame, x, y, k=7):
-    h, w = depth_frame.get_height(), depth_frame.get_width()
-    x, y = int(np.clip(x, 0, w - 1)), int(np.clip(y, 0, h - 1))
-    vals = []
-    for yy in range(max(0, y - k // 2), min(h, y + k // 2 + 1)):
-        for xx in range(max(0, x - k // 2), min(w, x + k // 2 + 1)):
-            d = depth_frame.get_distance(xx, yy)
-            if 0.05 < d < 2.0:
-                vals.append(d)
-    return float(np.median(vals)) if vals else 0.0
+def median_depths_at(depth_np, xs, ys, k=7, depth_scale=0.001):
+    """
+    Median depth in meters over a k x k window around each (x, y) of the raw Z16 image,
+    gathered for all points at once. Windows are clamped at the image border; points
+    with no valid pixel in (0.05, 2.0) m get 0.0.
+    """
+    h, w = depth_np.shape[:2]
+    offs = np.arange(k) - k // 2
+    rows = np.clip(np.asarray(ys, dtype=np.intp)[:, None] + offs, 0, h - 1)
+    cols = np.clip(np.asarray(xs, dtype=np.intp)[:, None] + offs, 0, w - 1)
+    patches = depth_np[rows[:, :, None], cols[:, None, :]].reshape(len(rows), -1) * np.float32(depth_scale)
+    patches[(patches <= 0.05) | (patches >= 2.0)] = np.inf
+    patches.sort(axis=1)
+    counts = np.isfinite(patches).sum(axis=1)
+    lo = np.take_along_axis(patches, np.maximum(counts - 1, 0)[:, None] // 2, axis=1)[:, 0]
+    hi = np.take_along_axis(patches, (counts // 2)[:, None], axis=1)[:, 0]
+    return np.where(counts > 0, (lo + hi) * 0.5, 0.0)
 
 
 # ======================= Multi-Frame Tracker =======================
@@ -231,31 +451,33 @@ class FaceTracker:
     Prevents single-frame false positives and false negatives.
     """
     def __init__(self):
-        self.history = []
+        self.history = deque(maxlen=CONFIRM_WINDOW_FRAMES)
+        self.counts = Counter()  # identity -> occurrences in history, kept in step with the deque
         self.last_seen = 0
 
     def update(self, identity, score, now):
         if identity == "uncertain":
             return
         self.last_seen = now
+        if len(self.history) == self.history.maxlen:
+            evicted = self.history[0][0]
+            self.counts[evicted] -= 1
+            if not self.counts[evicted]:
+                del self.counts[evicted]
         self.history.append((identity, score, now))
-        self.history = self.history[-CONFIRM_WINDOW_FRAMES:]
+        self.counts[identity] += 1
 
     def get_confirmed(self):
         if len(self.history) < CONFIRM_FRAMES_NEEDED:
             return None
-        counts = {}
-        for name, _, _ in self.history:
-            counts[name] = counts.get(name, 0) + 1
-        for name, count in counts.items():
-            if name == "unknown" and count >= UNKNOWN_CONFIRM_FRAMES:
-                return "unknown"
-            elif name != "unknown" and count >= CONFIRM_FRAMES_NEEDED:
-                return name
-        return None
+        top, count = self.counts.most_common(1)[0]
+        if top == "unknown":
+            return "unknown" if count >= UNKNOWN_CONFIRM_FRAMES else None
+        return top if count >= CONFIRM_FRAMES_NEEDED else None
 
     def reset(self):
         self.history.clear()
+        self.counts.clear()
 
     def is_stale(self, now, timeout=2.0):
         return (now - self.last_seen) > timeout
@@ -372,6 +594,56 @@ class RegistrationGUI:
         return frame
 
 
+# ======================= Text Sprites =======================
+
+def _render_text_sprite(items):
+    """
+    Rasterize [(text, (x, y), scale, color, thickness), ...] once into a BGR sprite
+    plus a boolean mask of drawn pixels, sized to fit every line.
+    """
+    h = w = 1
+    for text, (x, y), scale, _, thick in items:
+        (tw, _th), base = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thick)
+        w = max(w, x + tw + thick)
+        h = max(h, y + base + thick)
+    sprite = np.zeros((h, w, 3), np.uint8)
+    for text, org, scale, color, thick in items:
+        cv2.putText(sprite, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thick)
+    return sprite, sprite.any(axis=2, keepdims=True)
+
+
+def _blit_sprite(disp, y, x, sprite, mask):
+    """Copy a text sprite's drawn pixels onto disp at (x, y), clipped to the frame."""
+    y0, x0 = max(y, 0), max(x, 0)
+    roi = disp[y0:y + sprite.shape[0], x0:x + sprite.shape[1]]
+    rh, rw = roi.shape[:2]
+    if rh <= 0 or rw <= 0:
+        return
+    sy, sx = y0 - y, x0 - x
+    np.copyto(roi, sprite[sy:sy + rh, sx:sx + rw], where=mask[sy:sy + rh, sx:sx + rw])
+
+
+# ======================= Web Status =======================
+
+@dataclass(slots=True)
+class WebStatus:
+    """Mutable vision status published with every web frame (allocated once)."""
+    vision_state: str = "booting"
+    vision_message: str = "Initializing RealSense + InsightFace..."
+    match_name: str = ""
+    match_score: float | None = None
+    distance_m: float | None = None
+
+    def as_dict(self):
+        return {
+            "vision_state": self.vision_state,
+            "vision_message": self.vision_message,
+            "match_name": self.match_name,
+            "match_score": self.match_score,
+            "distance_m": self.distance_m,
+        }
+
+
 # ======================= Main System =======================
 
 class MedReminderVision:
@@ -379,27 +651,48 @@ class MedReminderVision:
         print("[INFO] Loading InsightFace (first run downloads ~30MB models)...")
         self.face_app = FaceAnalysis(
             name=INSIGHTFACE_MODEL,
-            root="./insightface_models",
-            providers=["CUDAExecutionProvider", "CPUExecutionProvider"]
+            root=f"./{INSIGHTFACE_ROOT.as_posix()}",
+            allowed_modules=["detection", "recognition"],
+            providers=_onnx_providers(),
         )
-        self.face_app.prepare(ctx_id=0, det_size=(640, 480))
+        self.face_app.prepare(ctx_id=0, det_size=DETECTION_SIZE)
+        self._recognizer = self.face_app.models["recognition"]
+        self._warmup_models()
         print("[INFO] InsightFace ready.")
 
         print("[INFO] Starting RealSense D435i...")
         self.pipe = rs.pipeline()
         cfg = rs.config()
-        cfg.enable_stream(rs.stream.depth, 848, 480, rs.format.z16, 30)
-        cfg.enable_stream(rs.stream.color, 848, 480, rs.format.bgr8, 30)
+        cfg.enable_stream(rs.stream.depth, *DEPTH_STREAM_SIZE, rs.format.z16, STREAM_FPS)
+        cfg.enable_stream(rs.stream.color, *COLOR_STREAM_SIZE, rs.format.bgr8, STREAM_FPS)
         self.profile = self.pipe.start(cfg)
         self.align = rs.align(rs.stream.color)
+        self.depth_scale = float(self.profile.get_device().first_depth_sensor().get_depth_scale())
+        # Native (SIMD) edge-preserving smoothing + temporal hole filling on the raw depth,
+        # before alignment. No decimation: DEPTH_STREAM_SIZE is already a native low-res mode.
+        self.depth_filters = []
+        if _env_flag("REALSENSE_DEPTH_FILTERS", default=True):
+            self.depth_filters = [rs.spatial_filter(), rs.temporal_filter()]
+        self._gate_min_raw = int(0.05 / self.depth_scale)
+        self._gate_max_raw = int(DEPTH_GATE_MAX_M / self.depth_scale)
+        # Capture/filter/align run on their own thread so they overlap inference.
+        # Newest frames win: the producer drops the oldest entry when the queue is full.
+        self._frame_q = queue.Queue(maxsize=2)
+        self._capture_stop = threading.Event()
         for _ in range(20):
             self.pipe.wait_for_frames(5000)
         print("[INFO] Camera ready.")
 
-        self.data = load_users()
+        self.bank_file = _MODULE_DIR / EMBEDDING_BANK_FILE
+        self.bank_ids_file = _MODULE_DIR / EMBEDDING_BANK_IDS_FILE
+        self._gallery = None
+        self._int8_match = _env_flag("REALSENSE_INT8_MATCH", default=False)
+        self._load_user_store()
         print(f"[INFO] {len(self.data['users'])} registered users.")
 
         self.tracker = FaceTracker()
+        self._frame_idx = 0
+        self._last_faces = []
         self.last_reminder = {}
         self.last_register = 0
         self.registering = False
@@ -408,33 +701,85 @@ class MedReminderVision:
         self.overlay_lines = []
         self.overlay_color = (0, 255, 0)
         self.overlay_expire = 0
+        self._overlay_band = None
+        self._overlay_sprite_key = None
+        self._overlay_sprite = None
+        self._hud_key = None
+        self._hud_sprite = None
+        self._hud_quit_sprite = None
+        self._label_sprites = {}
+        # Annotation buffers, rotated only when one is handed to the publisher thread: it
+        # holds at most two (one queued, one encoding), so the third is always free to draw on.
+        self._disp_bufs = [None, None, None]
+        self._disp_idx = 0
         self.fsm_bridge = RealSenseFSMAdapter()
         self.legacy_debug_ui_enabled = _env_flag("REALSENSE_LEGACY_DEBUG_UI", default=False)
         self.legacy_registration_ui_enabled = _env_flag("REALSENSE_LEGACY_REGISTRATION_UI", default=False)
         self.publish_web_stream_enabled = _env_flag("REALSENSE_WEB_STREAM_ENABLED", default=True)
-        self.runtime_dir = Path(__file__).resolve().parent / REALSENSE_RUNTIME_DIR
+        self.runtime_dir = _MODULE_DIR / REALSENSE_RUNTIME_DIR
         self.runtime_dir.mkdir(parents=True, exist_ok=True)
-        self.frame_file = Path(__file__).resolve().parent / REALSENSE_FRAME_FILE
-        self.frame_meta_file = Path(__file__).resolve().parent / REALSENSE_FRAME_META_FILE
-        self.frame_meta_lock_file = Path(__file__).resolve().parent / REALSENSE_FRAME_META_LOCK_FILE
-        self.pending_embed_file = Path(__file__).resolve().parent / REALSENSE_PENDING_EMBED_FILE
+        self.frame_file = _MODULE_DIR / REALSENSE_FRAME_FILE
+        self.frame_meta_file = _MODULE_DIR / REALSENSE_FRAME_META_FILE
+        self.frame_meta_lock_file = _MODULE_DIR / REALSENSE_FRAME_META_LOCK_FILE
+        self.pending_embed_file = _MODULE_DIR / REALSENSE_PENDING_EMBED_FILE
+        # Plain-string paths for the per-publish writes (no Path objects built per frame).
+        self._frame_path = str(self.frame_file)
+        self._meta_path = str(self.frame_meta_file)
+        self._pending_embed_path = str(self.pending_embed_file)
+        self._pending_emb_file_present = os.path.exists(self._pending_embed_path)
+        self._pending_emb_checked_at = 0.0
+        self._nvjpeg = None
+        if NvJpeg is not None and _env_flag("REALSENSE_GPU_JPEG", default=True):
+            try:
+                self._nvjpeg = NvJpeg()
+            except Exception:  # no CUDA device / nvJPEG runtime
+                self._nvjpeg = None
+        self._tj = None
+        if TurboJPEG is not None:
+            try:
+                self._tj = TurboJPEG()
+            except Exception:  # libturbojpeg shared library missing
+                self._tj = None
+        # Reused libjpeg-turbo destination; only touched from the publisher thread.
+        self._enc_buf = bytearray(FRAME_CHANNEL_MAX_JPEG) if self._tj is not None else None
         self._last_frame_publish = 0.0
         self._frame_publish_interval_s = 0.10  # ~10 FPS for web stream
+        self._last_frame_encode = 0.0
+        self._pub_buf = None  # downscaled preview, reused by the publisher thread
+        self._jpeg_quality = REALSENSE_JPEG_QUALITY
+        self._cached_iso_t = 0.0
+        self._cached_iso = ""
+        self._last_frame_thumb = None
+        # Single-slot handoff: encode + file writes run on a daemon thread so a slow
+        # disk or JPEG encode never stalls capture/inference. Frames are dropped if busy.
+        self._pub_q = queue.Queue(maxsize=1)
+        # Meta fields fixed for the life of the process, serialized once and spliced in.
+        self._meta_static = _json_bytes({
+            "legacy_debug_ui_enabled": self.legacy_debug_ui_enabled,
+            "legacy_registration_ui_enabled": self.legacy_registration_ui_enabled,
+            "publish_web_stream_enabled": self.publish_web_stream_enabled,
+            "distance_threshold_m": DETECTION_DISTANCE_M,
+        })[1:-1]
+        self._frame_channel = None
+        self._meta_channel = None
+        if self.publish_web_stream_enabled:
+            try:
+                self._frame_channel = FrameChannelWriter()
+                self._meta_channel = FrameChannelWriter(META_CHANNEL_NAME, max_payload=META_CHANNEL_MAX_BYTES)
+            except Exception as e:
+                print(f"[WARN] Shared-memory frame channel unavailable ({e}); using {REALSENSE_RUNTIME_DIR}/ files.")
+            threading.Thread(target=self._publisher_loop, name="web-frame-publisher", daemon=True).start()
         self._last_user_reload_check = 0.0
         self._user_reload_check_interval_s = 1.0
-        self._user_store_signature = self._compute_user_store_signature()
-        self._web_status = {
-            "vision_state": "booting",
-            "vision_message": "Initializing RealSense + InsightFace...",
-            "match_name": "",
-            "match_score": None,
-            "distance_m": None,
-        }
+        self._users_dirty = False
+        self._user_store_observer = self._start_user_store_watch()
+        self._web_status = WebStatus()
 
         if not self.legacy_debug_ui_enabled:
             print("[INFO] Legacy OpenCV window UI disabled (REALSENSE_LEGACY_DEBUG_UI=0).")
         if not self.legacy_registration_ui_enabled:
             print("[INFO] Legacy OpenCV registration input disabled; use touchscreen registration UI.")
+        print(f"[INFO] Web stream JPEG encoder: {self._jpeg_backend_name()}.")
 
     def set_overlay(self, lines, color=(0, 255, 0), dur=6.0):
         self.overlay_lines = lines
@@ -450,13 +795,12 @@ class MedReminderVision:
         match_score: float | None = None,
         distance_m: float | None = None,
     ):
-        self._web_status = {
-            "vision_state": str(vision_state or "").strip() or "unknown",
-            "vision_message": str(vision_message or "").strip(),
-            "match_name": str(match_name or "").strip(),
-            "match_score": float(match_score) if match_score is not None else None,
-            "distance_m": float(distance_m) if distance_m is not None else None,
-        }
+        s = self._web_status
+        s.vision_state = str(vision_state or "").strip() or "unknown"
+        s.vision_message = str(vision_message or "").strip()
+        s.match_name = str(match_name or "").strip()
+        s.match_score = float(match_score) if match_score is not None else None
+        s.distance_m = float(distance_m) if distance_m is not None else None
 
     def run(self):
         print(f"\n{'='*55}")
@@ -464,23 +808,24 @@ class MedReminderVision:
               f"{len(self.data['users'])}/{MAX_USERS} users | 'q' quit")
         print(f"{'='*55}\n")
 
+        capture = threading.Thread(target=self._capture_loop, name="realsense-capture", daemon=True)
+        capture.start()
         try:
             while True:
-                frames = self.pipe.wait_for_frames(5000)
+                item = self._frame_q.get()
+                if isinstance(item, BaseException):
+                    raise item
+                _aligned, img, depth_np = item  # the frameset keeps both views' buffers alive
                 self._maybe_reload_users()
-                aligned = self.align.process(frames)
-                depth_f = aligned.get_depth_frame()
-                color_f = aligned.get_color_frame()
-                if not depth_f or not color_f:
-                    continue
-
-                img = np.asanyarray(color_f.get_data())
-                disp = img.copy()
                 now = time.time()
-                self._set_web_status(
-                    vision_state="scanning",
-                    vision_message="Scanning for a face within distance threshold.",
+                # Only pay for the annotated copy when someone will see it this iteration.
+                need_disp = self.legacy_debug_ui_enabled or (
+                    self.publish_web_stream_enabled
+                    and (now - self._last_frame_publish) >= self._frame_publish_interval_s
                 )
+                disp = self._next_disp(img) if need_disp else img
+                # Every branch below sets the web status, except box-reuse frames, which
+                # keep the last detection's status so /meta does not flicker to "scanning".
 
                 # --- Registration mode ---
                 if self.registering:
@@ -492,10 +837,17 @@ class MedReminderVision:
                     if self.legacy_debug_ui_enabled:
                         key = cv2.waitKey(1) & 0xFFFF
                     self.reg_gui.handle_key(key)
-                    disp = self.reg_gui.draw(disp)
+                    if need_disp:
+                        disp = self.reg_gui.draw(disp)
                     if self.reg_gui.done:
                         r = self.reg_gui.result
-                        if r and self.pending_emb is not None and len(self.data["users"]) < MAX_USERS:
+                        dup = None
+                        if r and self.pending_emb is not None:
+                            # Someone may have registered this face (e.g. via the web UI) meanwhile.
+                            dup, _, _ = find_matching_user(self.pending_emb, self.data, gallery=self._gallery)
+                        if dup is not None:
+                            self.set_overlay([f"Already registered as {dup['name']}"], (0,165,255), 4)
+                        elif r and self.pending_emb is not None and len(self.data["users"]) < MAX_USERS:
                             first_med = r["medications"][0] if r.get("medications") else {}
                             user_id = _SHARED_STORE.build_user_id(r["name"])
                             self.data["users"].append({
@@ -508,6 +860,8 @@ class MedReminderVision:
                                 "face_encoding": self.pending_emb.tolist(),
                                 "created": datetime.now().isoformat(),
                             })
+                            _compile_med_schedule(self.data["users"][-1])
+                            self._gallery_add(len(self.data["users"]) - 1)
                             save_users(self.data)
                             self.set_overlay([f"Registered: {r['name']}",
                                               f"Users: {len(self.data['users'])}/{MAX_USERS}"], (0,255,0), 5)
@@ -520,49 +874,84 @@ class MedReminderVision:
                         self.pending_emb = None
                         self.tracker.reset()
                         self.fsm_bridge.reset_session_hint()
-                    self._publish_web_frame(disp)
+                    if need_disp and self._publish_web_frame(disp):
+                        self._disp_idx = (self._disp_idx + 1) % len(self._disp_bufs)
                     if self.legacy_debug_ui_enabled:
                         self._draw_hud(disp)
                         cv2.imshow("Med Reminder", disp)
                     continue
 
                 # --- Detection ---
-                faces = self.face_app.get(img)
+                # Between detections the previous boxes are reused and only depth is
+                # re-sampled; identity evidence comes from fresh embeddings only.
+                self._frame_idx += 1
+                detected = (
+                    self._frame_idx % DETECT_EVERY_N_FRAMES == 0
+                    or not self._last_faces
+                    or self.tracker.is_stale(now)
+                )
+                if detected:
+                    faces = self._detect_faces(img) if self._depth_roi_occupied(depth_np) else []
+                    self._last_faces = faces
+                else:
+                    faces = self._last_faces
 
-                # Pick closest in-range face
+                # Pick the closest in-range face. Depth for every candidate wide enough to
+                # be the subject is gathered in one vectorized pass.
                 best_face = None
                 best_dist = 999.0
-                for face in faces:
-                    bx = face.bbox.astype(int)
-                    cx, cy = (bx[0]+bx[2])//2, (bx[1]+bx[3])//2
-                    d = median_depth_at(depth_f, cx, cy, k=9)
-
-                    # Draw all faces
-                    if 0 < d <= DETECTION_DISTANCE_M:
-                        cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (0,255,0), 2)
-                        if self.legacy_debug_ui_enabled:
-                            cv2.putText(disp, f"{d:.2f}m", (bx[0], bx[1]-8),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0,255,0), 2)
-                        if d < best_dist:
-                            best_face = face
-                            best_dist = d
-                    elif d > DETECTION_DISTANCE_M:
-                        cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (100,100,100), 1)
-                        if self.legacy_debug_ui_enabled:
-                            cv2.putText(disp, f"{d:.2f}m (far)", (bx[0], bx[1]-8),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (100,100,100), 1)
-
-                if best_face is not None and best_face.embedding is not None:
+                boxes = np.array([f.bbox[:4] for f in faces], dtype=np.int32).reshape(-1, 4)
+                depths = np.zeros(len(faces), dtype=np.float32)
+                near = (boxes[:, 2] - boxes[:, 0]) >= MIN_FACE_BBOX_PX
+                if near.any():
+                    nb = boxes[near]
+                    depths[near] = median_depths_at(
+                        depth_np, (nb[:, 0] + nb[:, 2]) // 2, (nb[:, 1] + nb[:, 3]) // 2,
+                        k=DEPTH_WINDOW_PX if self.depth_filters else 9, depth_scale=self.depth_scale,
+                    )
+                in_range = near & (depths > 0) & (depths <= DETECTION_DISTANCE_M)
+                if in_range.any():
+                    best_i = int(np.flatnonzero(in_range)[np.argmin(depths[in_range])])
+                    best_face = faces[best_i]
+                    best_dist = float(depths[best_i])
+
+                if need_disp:
+                    for bx, d, ok, sampled in zip(boxes.tolist(), depths.tolist(), in_range.tolist(), near.tolist()):
+                        if ok:
+                            cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (0,255,0), 2)
+                            if self.legacy_debug_ui_enabled:
+                                self._draw_label(disp, f"{d:.2f}m", (bx[0], bx[1]-8), 0.55, (0,255,0), 2)
+                        elif sampled and d <= 0:
+                            continue  # no depth data under the face: leave it unmarked
+                        else:
+                            cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (100,100,100), 1)
+                            if self.legacy_debug_ui_enabled and d > DETECTION_DISTANCE_M:
+                                self._draw_label(disp, f"{d:.2f}m (far)", (bx[0], bx[1]-8), 0.5, (100,100,100), 1)
+
+                if best_face is not None and not detected:
+                    self.fsm_bridge.push_distance(best_dist)
+                    self._web_status.distance_m = best_dist
+                elif best_face is not None and (
+                    # Nobody to match against: every face is unknown, so ArcFace only
+                    # runs once "unknown" is confirmed and an embedding must be published.
+                    not self.data["users"] or self._embed_face(img, best_face) is not None
+                ):
                     if 0 < best_dist <= DETECTION_DISTANCE_M:
                         self.fsm_bridge.push_distance(best_dist)
                     emb = best_face.embedding
                     bx = best_face.bbox.astype(int)
-                    user, idx, score = find_matching_user(emb, self.data)
+                    if emb is None:
+                        user, idx, score = None, -1, 0.0
+                    else:
+                        user, idx, score = find_matching_user(
+                            emb, self.data, gallery=self._gallery
+                        )
 
                     if user and score >= MATCH_THRESHOLD:
                         name = user["name"]
                         self.tracker.update(name, score, now)
-                        cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (0,255,0), 3)
+                        if need_disp:
+                            cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (0,255,0), 3)
                         self._set_web_status(
                             vision_state="match_candidate",
                             vision_message="Matched known user candidate. Confirming...",
@@ -572,7 +961,8 @@ class MedReminderVision:
                         )
                     elif score < UNKNOWN_CEILING:
                         self.tracker.update("unknown", score, now)
-                        cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (0,165,255), 3)
+                        if need_disp:
+                            cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (0,165,255), 3)
                         self._set_web_status(
                             vision_state="unknown_candidate",
                             vision_message="Face not registered. Confirming before registration.",
@@ -581,7 +971,8 @@ class MedReminderVision:
                         )
                     else:
                         # Uncertain zone - keep watching
-                        cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (0,255,255), 2)
+                        if need_disp:
+                            cv2.rectangle(disp, (bx[0],bx[1]), (bx[2],bx[3]), (0,255,255), 2)
                         self._set_web_status(
                             vision_state="checking",
                             vision_message="Recognition confidence is uncertain. Keep facing the camera.",
@@ -594,28 +985,31 @@ class MedReminderVision:
                     if confirmed and confirmed != "unknown":
                         if now - self.last_reminder.get(confirmed, 0) > RECOGNITION_COOLDOWN_S:
                             self.last_reminder[confirmed] = now
-                            for u in self.data["users"]:
-                                if u["name"] == confirmed:
-                                    user_id = str(u.get("id", "")).strip()
-                                    if user_id:
-                                        self.fsm_bridge.report_recognition_existing(user_id, score)
-                                    meds = get_pending_meds(u)
-                                    self.set_overlay(
-                                        [f"Hello, {confirmed}! (age: {u.get('age','?')})",
-                                         "-"*30, "Medication Schedule:"] + meds,
-                                        (0,255,0), 8)
-                                    self._set_web_status(
-                                        vision_state="recognized",
-                                        vision_message=f"Recognized {confirmed}. Dispatching to dispenser workflow.",
-                                        match_name=confirmed,
-                                        match_score=score,
-                                        distance_m=best_dist,
-                                    )
-                                    print(f"[REMINDER] {confirmed}: {meds}")
-                                    break
+                            i = self._name_to_idx.get(confirmed)
+                            if i is not None:
+                                u = self.data["users"][i]
+                                user_id = str(u.get("id", "")).strip()
+                                if user_id:
+                                    self.fsm_bridge.report_recognition_existing(user_id, score)
+                                meds = get_pending_meds(u)
+                                self.set_overlay(
+                                    [f"Hello, {confirmed}! (age: {u.get('age','?')})",
+                                     "-"*30, "Medication Schedule:"] + meds,
+                                    (0,255,0), 8)
+                                self._set_web_status(
+                                    vision_state="recognized",
+                                    vision_message=f"Recognized {confirmed}. Dispatching to dispenser workflow.",
+                                    match_name=confirmed,
+                                    match_score=score,
+                                    distance_m=best_dist,
+                                )
+                                print(f"[REMINDER] {confirmed}: {meds}")
                             self.tracker.reset()
                     elif confirmed == "unknown":
-                        if now - self.last_register > REGISTER_COOLDOWN_S:
+                        if now - self.last_register > REGISTER_COOLDOWN_S and (
+                            emb is not None or self._embed_face(img, best_face) is not None
+                        ):
+                            emb = best_face.embedding
                             self.last_register = now
                             self.fsm_bridge.report_recognition_new(score)
                             self._publish_pending_embedding(emb, score)
@@ -658,7 +1052,8 @@ class MedReminderVision:
                     if self.tracker.is_stale(now):
                         self.tracker.reset()
 
-                self._publish_web_frame(disp)
+                if need_disp and self._publish_web_frame(disp):
+                    self._disp_idx = (self._disp_idx + 1) % len(self._disp_bufs)
                 if self.legacy_debug_ui_enabled:
                     self._draw_overlay(disp)
                     self._draw_hud(disp)
@@ -666,11 +1061,52 @@ class MedReminderVision:
                     if cv2.waitKey(1) & 0xFF == ord("q"):
                         break
         finally:
+            self._capture_stop.set()
             self.pipe.stop()
+            capture.join(timeout=6.0)
+            for channel in (self._frame_channel, self._meta_channel):
+                if channel is not None:
+                    channel.close()
+            if self._user_store_observer is not None:
+                self._user_store_observer.stop()
             if self.legacy_debug_ui_enabled:
                 cv2.destroyAllWindows()
             print("[INFO] Stopped.")
 
+    def _depth_roi_occupied(self, depth_np):
+        """Cheap pre-gate on raw Z16 values: is anything plausibly a person in the centre ROI?"""
+        h, w = depth_np.shape[:2]
+        roi = depth_np[h // 4:3 * h // 4, w // 4:3 * w // 4]
+        near = np.count_nonzero((roi > self._gate_min_raw) & (roi < self._gate_max_raw))
+        return near >= DEPTH_GATE_MIN_FRACTION * roi.size
+
+    def _capture_loop(self):
+        try:
+            while not self._capture_stop.is_set():
+                frames = self.pipe.wait_for_frames(5000)
+                for depth_filter in self.depth_filters:
+                    frames = depth_filter.process(frames).as_frameset()
+                aligned = self.align.process(frames)
+                depth_f = aligned.get_depth_frame()
+                color_f = aligned.get_color_frame()
+                if not depth_f or not color_f:
+                    continue
+                self._offer_frame((aligned, np.asanyarray(color_f.get_data()), np.asanyarray(depth_f.get_data())))
+        except Exception as e:
+            if not self._capture_stop.is_set():
+                self._offer_frame(e)  # re-raised on the main loop, which then shuts down
+
+    def _offer_frame(self, item):
+        while True:
+            try:
+                self._frame_q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._frame_q.get_nowait()
+                except queue.Empty:
+                    pass
+
     def _compute_user_store_signature(self):
         """
         Lightweight signature of canonical user/embedding JSON files so we can hot-reload
@@ -692,10 +1128,162 @@ class MedReminderVision:
                 latest_mtime_ns = max(latest_mtime_ns, int(getattr(stat, "st_mtime_ns", int(stat.st_mtime * 1e9))))
         return (json_count, latest_mtime_ns)
 
+    def _detect_faces(self, img):
+        """SCRFD only; embeddings are computed later for the selected face alone."""
+        h, w = img.shape[:2]
+        x0 = (w - h) // 2 if DETECT_CENTER_SQUARE and w > h else 0
+        roi = img[:, x0:x0 + h] if x0 else img
+        bboxes, kpss = self.face_app.det_model.detect(roi, max_num=MAX_DETECTED_FACES, metric="default")
+        if x0:
+            # Back to full-frame coordinates for depth sampling, drawing and ArcFace alignment.
+            bboxes[:, [0, 2]] += x0
+            if kpss is not None:
+                kpss[:, :, 0] += x0
+        return [
+            Face(bbox=bboxes[i, :4], kps=None if kpss is None else kpss[i], det_score=bboxes[i, 4])
+            for i in range(bboxes.shape[0])
+        ]
+
+    def _embed_face(self, img, face):
+        """ArcFace on one aligned crop; sets and returns face.embedding."""
+        if face.embedding is None and face.kps is not None:
+            self._recognizer.get(img, face)
+        return face.embedding
+
+    def _warmup_models(self):
+        """
+        Run SCRFD and ArcFace once on blank input so engine builds / CUDA kernel
+        selection happen at startup, not on the first real face.
+        """
+        w, h = COLOR_STREAM_SIZE
+        blank = np.zeros((h, w, 3), dtype=np.uint8)
+        crop = [np.zeros((112, 112, 3), dtype=np.uint8)]
+        try:
+            # A few passes: the first builds/selects kernels, the next settle allocator pools.
+            for _ in range(3):
+                self.face_app.det_model.detect(blank, max_num=MAX_DETECTED_FACES, metric="default")
+                self._recognizer.get_feat(crop)
+        except Exception as e:
+            print(f"[WARN] InsightFace warm-up skipped: {e}")
+
+    def _load_user_store(self):
+        """
+        Load users and the normalized embedding bank. When the saved bank was written
+        for the current store signature it is memory-mapped and the per-user embedding
+        JSON is not parsed at all.
+        """
+        data = load_users(include_embeddings=False)
+        sig = self._compute_user_store_signature()
+        bank = self._load_saved_embedding_bank(data["users"], sig)
+        if bank is None:
+            data = load_users()
+            bank = self._rebuild_embedding_cache(data["users"], sig)
+        self.data = data
+        self._set_gallery(bank, data["users"])
+        self._user_store_signature = sig
+
+    def _set_gallery(self, bank, users):
+        """Match-time view of the bank: only rows owned by a loaded user, in row order."""
+        pairs = sorted((u["_emb_row"], i) for i, u in enumerate(users) if u.get("_emb_row") is not None)
+        rows = [r for r, _ in pairs]
+        if rows != list(range(len(bank))):
+            bank = np.ascontiguousarray(bank[rows])
+        self._gallery = FaceGallery.build(bank, [i for _, i in pairs], quantize=self._int8_match)
+        self._name_to_idx = {}
+        for i, u in enumerate(users):
+            self._name_to_idx.setdefault(u["name"], i)
+
+    def _gallery_add(self, user_idx):
+        """Append a freshly registered user without waiting for the store reload."""
+        raw_encoding = self.data["users"][user_idx].get("face_encoding")
+        if raw_encoding is None:
+            return
+        vec = np.asarray(raw_encoding, dtype=np.float32).ravel()
+        if vec.size != EMBEDDING_DIM:
+            return
+        vec = vec / (np.linalg.norm(vec) + 1e-8)
+        self._gallery.append(vec, user_idx)
+        self._name_to_idx.setdefault(self.data["users"][user_idx]["name"], user_idx)
+
+    def _load_saved_embedding_bank(self, users, sig):
+        try:
+            meta = json.loads(self.bank_ids_file.read_text(encoding="utf-8"))
+            if meta.get("signature") != list(sig):
+                return None
+            bank = np.load(self.bank_file, mmap_mode="r")
+        except (OSError, ValueError, AttributeError):
+            return None
+        ids = meta.get("ids")
+        if not isinstance(ids, list) or bank.ndim != 2 or bank.shape[0] != len(ids):
+            return None
+        rows = {uid: i for i, uid in enumerate(ids)}
+        for u in users:
+            row = rows.get(u.get("id"))
+            if row is not None:
+                u["_emb_row"] = row
+        return bank
+
+    def _rebuild_embedding_cache(self, users, sig):
+        """
+        Stack every valid face_encoding into an L2-normalized matrix, tag each user with
+        its "_emb_row", and persist it as float16 plus the id ordering for next start.
+        Half precision moves cosine scores by well under 1e-3, far below the threshold gaps.
+        """
+        rows = []
+        ids = []
+        for u in users:
+            raw_encoding = u.get("face_encoding")
+            if raw_encoding is None:
+                continue
+            vec = np.asarray(raw_encoding, dtype=np.float32).ravel()
+            if vec.size != EMBEDDING_DIM:
+                continue
+            u["_emb_row"] = len(rows)
+            rows.append(vec / (np.linalg.norm(vec) + 1e-8))
+            ids.append(u.get("id"))
+        bank = np.vstack(rows).astype(np.float16) if rows else np.zeros((0, EMBEDDING_DIM), dtype=np.float16)
+        try:
+            self.bank_file.parent.mkdir(parents=True, exist_ok=True)
+            # Replace rather than overwrite: a previous bank may still be memory-mapped.
+            tmp = self.bank_file.with_suffix(".npy.tmp")
+            with open(tmp, "wb") as fh:
+                np.save(fh, bank)
+            os.replace(tmp, self.bank_file)
+            write_file_atomic(self.bank_ids_file, _json_bytes({"signature": list(sig), "ids": ids}))
+        except OSError as e:
+            print(f"[WARN] Could not persist embedding bank: {e}")
+        return bank
+
+    def _start_user_store_watch(self):
+        """Flag the store dirty on filesystem events; None means fall back to 1 Hz polling."""
+        if Observer is None:
+            return None
+        vision = self
+
+        class _DirtyFlag(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if not event.is_directory:
+                    vision._users_dirty = True
+
+        try:
+            observer = Observer()
+            for folder in (_SHARED_STORE.users_dir, _SHARED_STORE.embeddings_dir):
+                observer.schedule(_DirtyFlag(), str(folder), recursive=False)
+            observer.daemon = True
+            observer.start()
+        except Exception as e:
+            print(f"[WARN] User store watch unavailable ({e}); polling instead.")
+            return None
+        return observer
+
     def _maybe_reload_users(self):
         now = time.time()
         if (now - self._last_user_reload_check) < self._user_reload_check_interval_s:
             return
+        if self._user_store_observer is not None:
+            if not self._users_dirty:
+                return
+            self._users_dirty = False
         self._last_user_reload_check = now
 
         sig = self._compute_user_store_signature()
@@ -703,94 +1291,186 @@ class MedReminderVision:
             return
 
         old_count = len(self.data.get("users", []))
-        self.data = load_users()
-        self._user_store_signature = sig
+        self._load_user_store()
         new_count = len(self.data.get("users", []))
         print(f"[INFO] Reloaded user store: {old_count} -> {new_count} users.")
 
+    def _now_iso(self):
+        """UTC ISO timestamp for runtime payloads, re-formatted at most every 50 ms."""
+        t = time.time()
+        if (t - self._cached_iso_t) > 0.05:
+            self._cached_iso = datetime.fromtimestamp(t, timezone.utc).isoformat()
+            self._cached_iso_t = t
+        return self._cached_iso
+
+    def _next_disp(self, img):
+        """Copy `img` into the current annotation buffer (allocated once per stream size)."""
+        if self._disp_bufs[0] is None or self._disp_bufs[0].shape != img.shape:
+            self._disp_bufs = [np.empty_like(img) for _ in self._disp_bufs]
+        disp = self._disp_bufs[self._disp_idx]
+        np.copyto(disp, img)
+        return disp
+
     def _publish_web_frame(self, frame):
+        """Queue a frame for the publisher; True if the publisher now holds a reference to `frame`."""
         if not self.publish_web_stream_enabled:
-            return
+            return False
         now = time.time()
         if (now - self._last_frame_publish) < self._frame_publish_interval_s:
-            return
+            return False
         self._last_frame_publish = now
 
-        ok, buf = cv2.imencode(
-            ".jpg",
-            frame,
-            [int(cv2.IMWRITE_JPEG_QUALITY), int(REALSENSE_JPEG_QUALITY)],
-        )
-        if not ok:
-            return
-
-        tmp_frame = self.frame_file.with_suffix(".jpg.tmp")
-        tmp_frame.write_bytes(buf.tobytes())
-        try:
-            tmp_frame.replace(self.frame_file)
-        except PermissionError:
-            self.frame_file.write_bytes(buf.tobytes())
-            try:
-                if tmp_frame.exists():
-                    tmp_frame.unlink()
-            except OSError:
-                pass
-
+        # Idle scenes: skip the JPEG encode when the frame barely changed; meta still goes out.
+        thumb = cv2.resize(frame, (32, 24), interpolation=cv2.INTER_AREA)
+        if (
+            self._last_frame_thumb is not None
+            and (now - self._last_frame_encode) < FRAME_FORCE_PUBLISH_S
+            and float(cv2.absdiff(thumb, self._last_frame_thumb).mean()) < FRAME_UNCHANGED_MAD
+        ):
+            frame = None
+        else:
+            if self.legacy_debug_ui_enabled:
+                # The legacy window keeps drawing HUD/overlay onto `frame` after this call.
+                frame = frame.copy()
+        handed_off = frame is not None and not self.legacy_debug_ui_enabled
         meta = {
-            "updated_at": datetime.now(timezone.utc).isoformat(),
-            "legacy_debug_ui_enabled": self.legacy_debug_ui_enabled,
-            "legacy_registration_ui_enabled": self.legacy_registration_ui_enabled,
-            "publish_web_stream_enabled": self.publish_web_stream_enabled,
+            "updated_at": self._now_iso(),
             "tracking_count": len(self.tracker.history),
             "registering": bool(self.registering),
             "users_count": len(self.data.get("users", [])),
-            "distance_threshold_m": DETECTION_DISTANCE_M,
-            "pending_embedding_available": bool(self.pending_emb is not None or self.pending_embed_file.exists()),
-            "vision_status": self._web_status,
+            "pending_embedding_available": self.pending_emb is not None,
+            "vision_status": self._web_status.as_dict(),
         }
+        try:
+            self._pub_q.put_nowait((frame, meta))
+        except queue.Full:
+            return False
+        if frame is not None:
+            # Only a frame that actually reached the publisher becomes the new reference.
+            self._last_frame_thumb = thumb
+            self._last_frame_encode = now
+        return handed_off
+
+    def _publisher_loop(self):
+        while True:
+            frame, meta = self._pub_q.get()
+            try:
+                self._write_web_frame(frame, meta)
+            except Exception as e:
+                print(f"[WARN] Web frame publish failed: {e}")
+
+    def _write_web_frame(self, frame, meta):
+        if frame is not None:
+            t0 = time.perf_counter()
+            pw, ph = PUBLISH_FRAME_SIZE
+            if frame.shape[1] > pw or frame.shape[0] > ph:
+                if self._pub_buf is None:
+                    self._pub_buf = np.empty((ph, pw, 3), np.uint8)
+                frame = cv2.resize(frame, (pw, ph), dst=self._pub_buf, interpolation=cv2.INTER_AREA)
+            jpeg = self._encode_jpeg(frame)
+            if jpeg is None or len(jpeg) == 0:
+                return
+            if self._frame_channel is None or not self._frame_channel.publish(jpeg):
+                write_file_atomic(self._frame_path, jpeg)
+            self._adapt_jpeg_quality(time.perf_counter() - t0)
+
+        if not meta["pending_embedding_available"]:
+            meta["pending_embedding_available"] = self._pending_embed_file_present()
+        meta_bytes = b"{" + self._meta_static + b"," + _json_bytes(meta)[1:]
+        if self._meta_channel is not None and self._meta_channel.publish(meta_bytes):
+            return
+        if os.name != "nt":
+            # POSIX rename is atomic: readers see the old or the new file, never a torn one.
+            write_file_atomic(self._meta_path, meta_bytes)
+            return
         try:
             with _cross_process_file_lock(self.frame_meta_lock_file, timeout_s=0.12):
-                tmp_meta = self.frame_meta_file.with_suffix(".json.tmp")
-                tmp_meta.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
-                try:
-                    tmp_meta.replace(self.frame_meta_file)
-                except PermissionError:
-                    self.frame_meta_file.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
-                    try:
-                        if tmp_meta.exists():
-                            tmp_meta.unlink()
-                    except OSError:
-                        pass
+                write_file_atomic(self._meta_path, meta_bytes)
         except TimeoutError:
             # Skip this metadata frame if another process is briefly reading/writing.
             pass
 
+    def _adapt_jpeg_quality(self, elapsed_s):
+        """Back quality off when encode+write eats the publish budget; recover slowly."""
+        budget = self._frame_publish_interval_s
+        if elapsed_s > 0.5 * budget:
+            self._jpeg_quality = max(REALSENSE_JPEG_QUALITY_MIN, self._jpeg_quality - 5)
+        elif elapsed_s < 0.2 * budget and self._jpeg_quality < REALSENSE_JPEG_QUALITY:
+            self._jpeg_quality += 1
+
+    def _pending_embed_file_present(self):
+        """
+        Only this process creates the pending-embedding file; the FSM deletes it once the
+        embedding is attached. So stat it (at ~1 Hz) only while we believe it exists.
+        """
+        if self._pending_emb_file_present:
+            now = time.monotonic()
+            if (now - self._pending_emb_checked_at) >= 1.0:
+                self._pending_emb_checked_at = now
+                self._pending_emb_file_present = os.path.exists(self._pending_embed_path)
+        return self._pending_emb_file_present
+
+    def _jpeg_backend_name(self):
+        if self._nvjpeg is not None:
+            return "nvJPEG (GPU)"
+        if self._tj is not None:
+            return "libjpeg-turbo"
+        return "OpenCV"
+
+    def _encode_jpeg(self, frame):
+        """
+        Encode a BGR frame to a JPEG buffer (bytes or uint8 array), preferring
+        nvJPEG, then libjpeg-turbo, then OpenCV. Returns None on failure.
+        """
+        if not frame.flags["C_CONTIGUOUS"]:
+            frame = np.ascontiguousarray(frame)
+        if self._nvjpeg is not None:
+            try:
+                return self._nvjpeg.encode(frame, int(self._jpeg_quality))
+            except Exception:
+                self._nvjpeg = None
+        if self._tj is not None:
+            opts = dict(quality=int(self._jpeg_quality), pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+            if self._enc_buf is not None:
+                try:
+                    _, size = self._tj.encode(frame, dst=self._enc_buf, **opts)
+                    return memoryview(self._enc_buf)[:size]
+                except TypeError:  # PyTurboJPEG < 1.7 has no dst=
+                    self._enc_buf = None
+                except OSError:  # frame did not fit; let libjpeg-turbo allocate this once
+                    pass
+            try:
+                return self._tj.encode(frame, **opts)
+            except Exception:
+                self._tj = None
+        ok, buf = cv2.imencode(
+            ".jpg",
+            frame,
+            [
+                int(cv2.IMWRITE_JPEG_QUALITY), int(self._jpeg_quality),
+                int(cv2.IMWRITE_JPEG_OPTIMIZE), 0,
+                int(cv2.IMWRITE_JPEG_PROGRESSIVE), 0,
+            ],
+        )
+        return buf if ok else None
+
     def _publish_pending_embedding(self, embedding, score):
         if embedding is None:
             return
         try:
-            emb = [float(v) for v in np.asarray(embedding, dtype=np.float32).flatten().tolist()]
+            emb = np.ascontiguousarray(embedding, dtype=np.float32).ravel()
         except Exception:
             return
         payload = {
-            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "updated_at": self._now_iso(),
             "source": "realsense_unknown_face",
             "model": INSIGHTFACE_MODEL,
             "score": float(score) if score is not None else None,
             "embedding": emb,
-            "dim": len(emb),
+            "dim": int(emb.size),
         }
-        tmp = self.pending_embed_file.with_suffix(".json.tmp")
-        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
-        try:
-            tmp.replace(self.pending_embed_file)
-        except PermissionError:
-            self.pending_embed_file.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
-            try:
-                if tmp.exists():
-                    tmp.unlink()
-            except OSError:
-                pass
+        write_file_atomic(self._pending_embed_path, _json_bytes(payload))
+        self._pending_emb_file_present = True
 
     def _draw_overlay(self, disp):
         if not self.overlay_lines or time.time() >= self.overlay_expire:
@@ -799,25 +1479,51 @@ class MedReminderVision:
         n = len(self.overlay_lines)
         ph = 30 + 28 * n
         py = h - ph - 12
-        ov = disp.copy()
-        cv2.rectangle(ov, (12, py), (w-12, h-12), (20,20,20), -1)
-        cv2.rectangle(ov, (12, py), (w-12, h-12), self.overlay_color, 2)
-        cv2.addWeighted(ov, 0.85, disp, 0.15, 0, disp)
-        for i, line in enumerate(self.overlay_lines):
-            cv2.putText(disp, line, (28, py+26+i*28),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, self.overlay_color, 2)
+        # Darken only the panel band in place instead of blending a full-frame copy.
+        roi = disp[max(py, 0):h-11, 12:w-11]
+        if self._overlay_band is None or self._overlay_band.shape != roi.shape:
+            self._overlay_band = np.full(roi.shape, 20, np.uint8)
+        cv2.addWeighted(self._overlay_band, 0.85, roi, 0.15, 0, dst=roi)
+        cv2.rectangle(disp, (12, py), (w-12, h-12), self.overlay_color, 2)
+        key = (tuple(self.overlay_lines), self.overlay_color)
+        if key != self._overlay_sprite_key:
+            self._overlay_sprite = _render_text_sprite(
+                [(line, (16, 26+i*28), 0.6, self.overlay_color, 2) for i, line in enumerate(self.overlay_lines)]
+            )
+            self._overlay_sprite_key = key
+        _blit_sprite(disp, py, 12, *self._overlay_sprite)
+
+    def _draw_label(self, disp, text, org, scale, color, thick):
+        """putText replacement for short per-frame labels, rasterized once per distinct string."""
+        key = (text, scale, color, thick)
+        cached = self._label_sprites.get(key)
+        if cached is None:
+            if len(self._label_sprites) >= 256:
+                self._label_sprites.clear()
+            (_, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thick)
+            ascent = th + thick
+            cached = (ascent,) + _render_text_sprite([(text, (0, ascent), scale, color, thick)])
+            self._label_sprites[key] = cached
+        ascent, sprite, mask = cached
+        _blit_sprite(disp, org[1] - ascent, org[0], sprite, mask)
 
     def _draw_hud(self, disp):
         h, w = disp.shape[:2]
-        cv2.putText(disp, f"Users: {len(self.data['users'])}/{MAX_USERS} | "
-                          f"Range: {DETECTION_DISTANCE_M*100:.0f}cm",
-                    (8, 22), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,200,255), 2)
-        nh = len(self.tracker.history)
-        if nh:
-            cv2.putText(disp, f"Tracking: {nh}/{CONFIRM_FRAMES_NEEDED} frames",
-                        (8, 48), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (180,180,180), 1)
-        cv2.putText(disp, "'q' quit", (w-100, h-8),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (100,100,100), 1)
+        # Text only changes with the user count / tracking depth; re-rasterize just then.
+        key = (len(self.data["users"]), len(self.tracker.history))
+        if key != self._hud_key:
+            users_count, nh = key
+            items = [(f"Users: {users_count}/{MAX_USERS} | Range: {DETECTION_DISTANCE_M*100:.0f}cm",
+                      (8, 22), 0.6, (0,200,255), 2)]
+            if nh:
+                items.append((f"Tracking: {nh}/{CONFIRM_FRAMES_NEEDED} frames",
+                              (8, 48), 0.5, (180,180,180), 1))
+            self._hud_sprite = _render_text_sprite(items)
+            self._hud_key = key
+        _blit_sprite(disp, 0, 0, *self._hud_sprite)
+        if self._hud_quit_sprite is None:
+            self._hud_quit_sprite = _render_text_sprite([("'q' quit", (0, 12), 0.45, (100,100,100), 1)])
+        _blit_sprite(disp, h-20, w-100, *self._hud_quit_sprite)
 
 
 if __name__ == "__main__":
@@ -1,24 +1,126 @@
 from __future__ import annotations
 
+import atexit
 import base64
+import binascii
+import copy
+import itertools
 import json
 import os
 import re
-from datetime import datetime, timedelta, timezone
+import time
+import weakref
+from collections import deque
+from datetime import datetime, timezone
 from enum import Enum
 from pathlib import Path
-from threading import RLock
-from typing import Any
+from threading import Lock
+from typing import Any, BinaryIO, Iterator
 from zoneinfo import ZoneInfo
 
 from advice_engine import generate_advice_payload
-from shared_user_storage import SharedUserStorage
+from shared_user_storage import SharedUserStorage, json_loads, write_file_atomic
 
 try:
     import serial  # type: ignore
 except Exception:  # pragma: no cover - optional dependency at runtime
     serial = None
 
+try:
+    import msgpack  # type: ignore
+except Exception:  # pragma: no cover - optional binary log format
+    msgpack = None
+
+
+HISTORY_MAX_EVENTS = 500  # in-memory transition ring; session logs keep per-session timelines
+LOG_FLUSH_EVERY_LINES = 32  # buffered log records before a forced flush between session boundaries
+
+
+_UNSAFE_ID_CHARS_RE = re.compile(r"[^a-zA-Z0-9_-]")
+_SLUG_SEPARATOR_RE = re.compile(r"[^a-z0-9]+")
+_FIRST_INT_RE = re.compile(r"(\d+)")
+_HHMM_RE = re.compile(r"(\d{1,2}):(\d{2})")
+
+_ENV_FALSE = frozenset({"0", "false", "no", "off"})
+
+
+def _env_str(name: str, default: str) -> str:
+    return str(os.getenv(name, default)).strip().lower() or default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() not in _ENV_FALSE
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def _compact_stamp(dt: datetime, *, micros: bool = False) -> str:
+    # Same output as strftime("%Y%m%d%H%M%S[%f]") without going through the C locale formatter.
+    stamp = f"{dt.year:04d}{dt.month:02d}{dt.day:02d}{dt.hour:02d}{dt.minute:02d}{dt.second:02d}"
+    return f"{stamp}{dt.microsecond:06d}" if micros else stamp
+
+
+def _b64decode_strict(data: memoryview) -> bytes:
+    """Validating base64 decode that reads the buffer in place (no intermediate copy)."""
+    try:
+        return binascii.a2b_base64(data, strict_mode=True)
+    except TypeError:  # Python < 3.11 has no strict_mode
+        return base64.b64decode(data.tobytes(), validate=True)
+
+
+# Instances still open at interpreter exit; weak so registration does not keep an FSM alive.
+_OPEN_FSMS: weakref.WeakSet[PillDispenserFSM] = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_fsms() -> None:
+    for fsm in list(_OPEN_FSMS):
+        fsm.close(lock_timeout_s=2.0)
+
+
+def _write_bytes_creating_parent(path: Path, data: bytes) -> None:
+    """Assume the parent exists; create it only if the write says otherwise."""
+    try:
+        path.write_bytes(data)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def read_log_records(path: str | Path) -> Iterator[dict[str, Any]]:
+    """
+    Iterate records of a dispense/session log: JSON lines for *.jsonl, otherwise
+    4-byte big-endian length-prefixed MessagePack frames. A torn trailing record is skipped.
+    """
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        with path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        return
+    if msgpack is None:
+        raise RuntimeError("msgpack is required to read binary logs.")
+    data = path.read_bytes()
+    pos = 0
+    while pos + 4 <= len(data):
+        size = int.from_bytes(data[pos:pos + 4], "big")
+        frame = data[pos + 4:pos + 4 + size]
+        if len(frame) < size:
+            return
+        yield msgpack.unpackb(frame, raw=False)
+        pos += 4 + size
+
 
 class WorkflowState(str, Enum):
     WAITING_FOR_USER = "WAITING_FOR_USER"
@@ -39,6 +141,8 @@ class PillDispenserFSM:
     ESP32, RealSense, and Gemini calls are represented with placeholders.
     """
 
+    _dirs_initialized = False  # data/ subfolders are created once per process
+
     def __init__(
         self,
         distance_threshold_m: float = 0.7,
@@ -47,10 +151,10 @@ class PillDispenserFSM:
         dispense_display_seconds: float = 4.0,
         advice_generation_seconds: float = 1.2,
     ) -> None:
-        self._lock = RLock()
+        self._lock = Lock()  # public entrypoints only; helpers never re-acquire
         self._state = WorkflowState.WAITING_FOR_USER
         self._last_error = ""
-        self._history: list[dict[str, str]] = []
+        self._history: deque[dict[str, str]] = deque(maxlen=HISTORY_MAX_EVENTS)
 
         self._distance_threshold_m = distance_threshold_m
         self._success_display_seconds = success_display_seconds
@@ -68,20 +172,21 @@ class PillDispenserFSM:
         self._advice_text = ""
         self._last_advice_payload: dict[str, Any] = {}
         self._is_speaking = False
-        self._speech_ends_at: datetime | None = None
-        self._auto_return_at: datetime | None = None
-        self._dispense_stage_ends_at: datetime | None = None
-        self._advice_generation_ends_at: datetime | None = None
+        self._speech_ends_at: int | None = None  # time.monotonic_ns() deadline
+        self._auto_return_at: int | None = None  # time.monotonic_ns() deadline
+        self._dispense_stage_ends_at: int | None = None  # time.monotonic_ns() deadline
+        self._advice_generation_ends_at: int | None = None  # time.monotonic_ns() deadline
 
         self._compute_node = "JETSON_LOCAL"
         self._camera_source = "REALSENSE_LOCAL"
         self._uart_transport = "USB_UART"
         self._uart_port = "/dev/ttyUSB0"
         self._uart_baud = 115200
-        self._uart_protocol = (str(os.getenv("UART_PROTOCOL", "json")).strip().lower() or "json")
-        self._uart_timeout_s = max(0.5, float(os.getenv("UART_TIMEOUT_S", "6") or "6"))
-        self._uart_serial_enabled = str(os.getenv("UART_SERIAL_ENABLED", "1")).strip().lower() not in {"0", "false", "no", "off"}
-        self._uart_offline_fallback = str(os.getenv("UART_OFFLINE_FALLBACK", "1")).strip().lower() not in {"0", "false", "no", "off"}
+        self._uart_protocol = _env_str("UART_PROTOCOL", "json")
+        self._uart_timeout_s = max(0.5, _env_float("UART_TIMEOUT_S", 6.0))
+        self._uart_serial_enabled = _env_bool("UART_SERIAL_ENABLED", True)
+        self._uart_offline_fallback = _env_bool("UART_OFFLINE_FALLBACK", True)
+        self._serial: Any = None
         self._motor_power = "EXTERNAL_BATTERY"
 
         self._base_dir = Path(__file__).resolve().parent
@@ -89,14 +194,28 @@ class PillDispenserFSM:
         self._faces_dir = self._base_dir / "data" / "faces"
         self._logs_dir = self._base_dir / "data" / "logs"
         self._runtime_dir = self._base_dir / "data" / "runtime"
-        self._users_dir.mkdir(parents=True, exist_ok=True)
-        self._faces_dir.mkdir(parents=True, exist_ok=True)
-        self._logs_dir.mkdir(parents=True, exist_ok=True)
-        self._runtime_dir.mkdir(parents=True, exist_ok=True)
-        self._dispense_log_file = self._logs_dir / "dispense_log.jsonl"
-        self._session_log_file = self._logs_dir / "session_log.jsonl"
+        if not PillDispenserFSM._dirs_initialized:
+            # Writers below also recreate their parent on FileNotFoundError if it vanishes later.
+            for folder in (self._users_dir, self._faces_dir, self._logs_dir, self._runtime_dir):
+                folder.mkdir(parents=True, exist_ok=True)
+            PillDispenserFSM._dirs_initialized = True
+        # FSM_LOG_FORMAT=msgpack switches both logs to length-prefixed MessagePack (read with read_log_records).
+        self._log_msgpack = msgpack is not None and _env_str("FSM_LOG_FORMAT", "jsonl") == "msgpack"
+        log_suffix = ".msgpack" if self._log_msgpack else ".jsonl"
+        self._dispense_log_file = self._logs_dir / f"dispense_log{log_suffix}"
+        self._session_log_file = self._logs_dir / f"session_log{log_suffix}"
+        # Append handles stay open for the process lifetime (opened on first write);
+        # buffered lines are flushed at session boundaries, every LOG_FLUSH_EVERY_LINES, and on close().
+        self._log_handles: dict[Path, BinaryIO] = {}
+        self._pending_log_lines = 0
+        self._unsynced_logs: set[Path] = set()
+        _OPEN_FSMS.add(self)
         self._shared_store = SharedUserStorage(self._base_dir)
         self._pending_realsense_embedding_file = self._runtime_dir / "realsense_pending_embedding.json"
+        # (key, profiles) swapped as one tuple so status()/list_users() can read it outside _lock.
+        self._profile_cache: tuple[tuple[Any, int] | None, dict[str, tuple[dict[str, Any], float]]] = (None, {})
+        self._profile_generation = 0
+        self._name_index: tuple[dict | None, dict[str, tuple[str, dict[str, Any]]]] = (None, {})
         self._session_context: dict[str, Any] = {}
         self._last_session_summary: dict[str, Any] = {}
         self._manual_override_available = False
@@ -106,12 +225,14 @@ class PillDispenserFSM:
     def status(self) -> dict:
         with self._lock:
             self._maybe_auto_progress()
-            return self._snapshot()
+            snapshot = self._snapshot(include_users=False)
+        snapshot["known_users"] = self._list_known_users()
+        return snapshot
 
     def list_users(self) -> list[dict[str, str]]:
         with self._lock:
             self._maybe_auto_progress()
-            return self._list_known_users()
+        return self._list_known_users()
 
     def start_monitoring(self) -> dict:
         with self._lock:
@@ -191,7 +312,7 @@ class PillDispenserFSM:
                     "source": safe_source,
                     "confidence": normalized_confidence,
                 }
-                self._session_context["recognition"] = dict(self._last_recognition)
+                self._session_context["recognition"] = self._last_recognition
                 self._transition(
                     WorkflowState.REGISTER_NEW_USER,
                     "Local face recognition did not match. Switching to new user registration.",
@@ -235,7 +356,7 @@ class PillDispenserFSM:
                 "confidence": normalized_confidence,
             }
             self._session_context["user_id"] = resolved_user_id
-            self._session_context["recognition"] = dict(self._last_recognition)
+            self._session_context["recognition"] = self._last_recognition
             self._transition(
                 WorkflowState.DISPENSING_PILL,
                 f"Local recognition matched existing user: {profile.get('name', resolved_user_id)}.",
@@ -256,9 +377,7 @@ class PillDispenserFSM:
                 result="SKIPPED" if str(self._last_uart_result.get("status", "")).upper() == "NO_DUE" else "SUCCESS",
                 details=f"uart={self._uart_transport} status={self._last_uart_result.get('status', 'UNKNOWN')}",
             )
-            self._dispense_stage_ends_at = self._now() + timedelta(
-                seconds=self._dispense_display_seconds
-            )
+            self._dispense_stage_ends_at = self._deadline_in(self._dispense_display_seconds)
             return self._response(
                 True,
                 "Existing user recognized locally. Dispensing UI active; advice will start after dispense stage completes.",
@@ -399,9 +518,7 @@ class PillDispenserFSM:
                 WorkflowState.REGISTRATION_SUCCESS,
                 (f"Updated existing user profile for {name}." if is_overwrite else f"Registered new user {name}."),
             )
-            self._auto_return_at = self._now() + timedelta(
-                seconds=self._success_display_seconds
-            )
+            self._auto_return_at = self._deadline_in(self._success_display_seconds)
             self._finalize_session_record(
                 result="REGISTRATION_SUCCESS",
                 note=(f"Updated existing user {user_id} by same-name overwrite." if is_overwrite else f"Registered new user {user_id}."),
@@ -428,9 +545,7 @@ class PillDispenserFSM:
                 WorkflowState.SESSION_SUCCESS,
                 "Advice stopped by user. Session complete.",
             )
-            self._auto_return_at = self._now() + timedelta(
-                seconds=self._success_display_seconds
-            )
+            self._auto_return_at = self._deadline_in(self._success_display_seconds)
             self._finalize_session_record(
                 result="SESSION_SUCCESS",
                 note="Advice stopped by user.",
@@ -480,6 +595,7 @@ class PillDispenserFSM:
                 )
             self._clear_runtime_context(clear_error=True)
             self._transition(WorkflowState.WAITING_FOR_USER, "Manual reset.")
+            self._flush_logs()
             return self._response(True, "Reset to initial start screen.")
 
     def record_dispense(self, payload: dict[str, Any]) -> dict:
@@ -517,13 +633,7 @@ class PillDispenserFSM:
             )
             self._last_advice_payload = advice_payload if isinstance(advice_payload, dict) else {}
             self._ensure_session_context()
-            self._session_context["advice"] = {
-                "source": str(self._last_advice_payload.get("source", "unknown")),
-                "model": str(self._last_advice_payload.get("model", "")),
-                "side_effects": list(self._last_advice_payload.get("side_effects", []) or []),
-                "environment_summary": dict(self._last_advice_payload.get("environment_summary", {}) or {}),
-                "schedule_summary": dict(self._last_advice_payload.get("schedule_summary", {}) or {}),
-            }
+            self._session_context["advice"] = self._advice_session_entry(self._last_advice_payload)
             response = self._response(True, "Advice payload generated.")
             response["advice_payload"] = advice_payload
             return response
@@ -538,7 +648,7 @@ class PillDispenserFSM:
         override_channels: list[int] | None = None,
     ) -> bool:
         user_id = str(profile.get("id", self._active_user_id))
-        request_id = f"disp-{self._now().strftime('%Y%m%d%H%M%S')}"
+        request_id = f"disp-{_compact_stamp(self._now())}"
         dispense_plan = self._build_dispense_plan(
             profile,
             override=override,
@@ -550,7 +660,7 @@ class PillDispenserFSM:
 
         self._ensure_session_context()
         self._session_context["user_id"] = user_id
-        self._session_context["dispense_payload"] = dict(dispense_plan)
+        self._session_context["dispense_payload"] = dispense_plan
 
         if not dispense_plan.get("should_dispense", False):
             status = str(dispense_plan.get("status", "NO_DUE")).upper()
@@ -579,7 +689,7 @@ class PillDispenserFSM:
                 "channel_counts": list(dispense_plan.get("channel_counts", [0, 0, 0, 0])),
                 "power_domain": self._motor_power,
             }
-            self._session_context["uart_ack"] = dict(self._last_uart_result)
+            self._session_context["uart_ack"] = self._last_uart_result
             return True
 
         channel_counts = list(dispense_plan.get("channel_counts", [0, 0, 0, 0]))
@@ -617,7 +727,7 @@ class PillDispenserFSM:
 
         response = self._send_uart_dispense_command(command)
         self._last_uart_result = response
-        self._session_context["uart_ack"] = dict(response)
+        self._session_context["uart_ack"] = response
         return bool(response.get("ack", False))
 
     def _generate_health_advice(self, profile: dict[str, Any]) -> str:
@@ -628,13 +738,7 @@ class PillDispenserFSM:
         )
         self._last_advice_payload = payload if isinstance(payload, dict) else {}
         self._ensure_session_context()
-        self._session_context["advice"] = {
-            "source": str(self._last_advice_payload.get("source", "unknown")),
-            "model": str(self._last_advice_payload.get("model", "")),
-            "side_effects": list(self._last_advice_payload.get("side_effects", []) or []),
-            "environment_summary": dict(self._last_advice_payload.get("environment_summary", {}) or {}),
-            "schedule_summary": dict(self._last_advice_payload.get("schedule_summary", {}) or {}),
-        }
+        self._session_context["advice"] = self._advice_session_entry(self._last_advice_payload)
         name = str(profile.get("name", "there"))
         medication = payload.get("medication", "your medication")
         effects = ", ".join(payload.get("side_effects", []))
@@ -649,9 +753,6 @@ class PillDispenserFSM:
         active = self._active_user_profile if isinstance(self._active_user_profile, dict) else {}
         name = str(active.get("name", "")).strip()
         medication = str(payload.get("medication", active.get("medication", ""))).strip()
-        side_effects = payload.get("side_effects") if isinstance(payload.get("side_effects"), list) else []
-        schedule_guidance = payload.get("schedule_guidance") if isinstance(payload.get("schedule_guidance"), list) else []
-        environment_guidance = payload.get("environment_guidance") if isinstance(payload.get("environment_guidance"), list) else []
         advice = str(payload.get("advice", self._advice_text)).strip()
 
         parts: list[str] = []
@@ -659,24 +760,37 @@ class PillDispenserFSM:
             parts.append(f"Hello {name}.")
         if medication:
             parts.append(f"You just received {medication}.")
-        normalized_effects = [self._clean_text(x) for x in side_effects if self._clean_text(x)]
+        normalized_effects = self._clean_text_items(payload.get("side_effects"), limit=3)
         if normalized_effects:
-            parts.append(f"Common side effects may include {', '.join(normalized_effects[:3])}.")
+            parts.append(f"Common side effects may include {', '.join(normalized_effects)}.")
         if advice:
             parts.append(advice)
-        normalized_schedule = [self._clean_text(x) for x in schedule_guidance if self._clean_text(x)]
+        normalized_schedule = self._clean_text_items(payload.get("schedule_guidance"), limit=3)
         if normalized_schedule:
-            parts.append("Timing reminder: " + " ".join(normalized_schedule[:3]))
-        normalized_env = [self._clean_text(x) for x in environment_guidance if self._clean_text(x)]
+            parts.append("Timing reminder: " + " ".join(normalized_schedule))
+        normalized_env = self._clean_text_items(payload.get("environment_guidance"), limit=3)
         if normalized_env:
-            parts.append("Today: " + " ".join(normalized_env[:3]))
+            parts.append("Today: " + " ".join(normalized_env))
         return self._clean_text(" ".join(parts)) or self._clean_text(self._advice_text)
 
+    def _clean_text_items(self, values: Any, *, limit: int) -> list[str]:
+        """First `limit` non-empty cleaned strings of a payload list; stops once it has enough."""
+        out: list[str] = []
+        if not isinstance(values, list):
+            return out
+        for value in values:
+            text = self._clean_text(value)
+            if text:
+                out.append(text)
+                if len(out) >= limit:
+                    break
+        return out
+
     def _estimate_advice_speech_seconds(self) -> int:
         text = self._compose_advice_speech_text()
         if not text:
             return max(6, int(self._speech_duration_seconds))
-        words = len([w for w in re.split(r"\s+", text) if w])
+        words = len(text.split())
         # Conservative speech estimate to avoid server-side timeout beating browser TTS.
         estimated = int((words / 2.2) + 3)
         return max(int(self._speech_duration_seconds), min(estimated, 90))
@@ -697,6 +811,16 @@ class PillDispenserFSM:
         _ = advice_text
         return True
 
+    def _advice_session_entry(self, payload: dict[str, Any]) -> dict[str, Any]:
+        # Session context shares the payload's containers; payloads are replaced, never mutated in place.
+        return {
+            "source": str(payload.get("source", "unknown")),
+            "model": str(payload.get("model", "")),
+            "side_effects": payload.get("side_effects") or [],
+            "environment_summary": payload.get("environment_summary") or {},
+            "schedule_summary": payload.get("schedule_summary") or {},
+        }
+
     def _stop_speaking(self) -> None:
         # TODO: stop speaker/TTS playback module.
         return
@@ -807,61 +931,85 @@ class PillDispenserFSM:
         if not isinstance(channel_counts, list):
             channel_counts = [0, 0, 0, 0]
 
-        with serial.Serial(self._uart_port, self._uart_baud, timeout=timeout_s) as ser:  # type: ignore[attr-defined]
+        # Encode before touching the port so a malformed command never tears down a healthy link.
+        if proto == "frame":
+            frame_bytes = command.get("frame_bytes")
+            if not isinstance(frame_bytes, list) or not frame_bytes:
+                raise ValueError("Missing frame_bytes for UART frame protocol.")
+            out = bytes(int(b) & 0xFF for b in frame_bytes)
+        else:
+            payload = {
+                "pill1": int(channel_counts[0] or 0),
+                "pill2": int(channel_counts[1] or 0),
+                "pill3": int(channel_counts[2] or 0),
+                "pill4": int(channel_counts[3] or 0),
+            }
+            out = (json.dumps(payload) + "\n").encode("utf-8")
+
+        ser = self._get_serial(timeout_s)
+        try:
+            # Drop stale bytes (late ACKs, boot chatter) so readline() sees this command's reply.
+            # Output needs no reset: every write below is flushed before returning.
             try:
                 ser.reset_input_buffer()
-                ser.reset_output_buffer()
             except Exception:
                 pass
-
-            if proto == "frame":
-                frame_bytes = command.get("frame_bytes")
-                if not isinstance(frame_bytes, list) or not frame_bytes:
-                    raise ValueError("Missing frame_bytes for UART frame protocol.")
-                ser.write(bytes(int(b) & 0xFF for b in frame_bytes))
-            else:
-                payload = {
-                    "pill1": int(channel_counts[0] or 0),
-                    "pill2": int(channel_counts[1] or 0),
-                    "pill3": int(channel_counts[2] or 0),
-                    "pill4": int(channel_counts[3] or 0),
-                }
-                ser.write((json.dumps(payload) + "\n").encode("utf-8"))
-
+            ser.write(out)
             ser.flush()
             raw = ser.readline()
-            if not raw:
-                return {
-                    "ack": False,
-                    "status": "TIMEOUT",
-                    "message": f"No ACK within {timeout_s:.1f}s",
-                    "hardware_online": False,
-                }
-
-            text = raw.decode("utf-8", errors="replace").strip()
-            parsed: dict[str, Any] = {}
-            if text.startswith("{") and text.endswith("}"):
-                try:
-                    obj = json.loads(text)
-                except json.JSONDecodeError:
-                    obj = {}
-                if isinstance(obj, dict):
-                    parsed = obj
-
-            ack_status = str(parsed.get("status", text or "ACK")).strip()
-            ack_ok = ack_status.lower() in {"done", "ok", "success", "ack"} or bool(parsed)
+        except (serial.SerialException, OSError):
+            # Port went away (USB unplug, ESP32 power cycle); reopen on the next dispense.
+            self._close_serial()
+            raise
 
+        if not raw:
             return {
-                "ack": bool(ack_ok),
-                "status": ack_status or "ACK",
-                "raw_ack": text,
-                "protocol": proto,
-                "hardware_online": True,
-                "degraded": False,
-                "ack_payload": parsed,
-                "ack_counts": parsed.get("counts") if isinstance(parsed.get("counts"), list) else [],
+                "ack": False,
+                "status": "TIMEOUT",
+                "message": f"No ACK within {timeout_s:.1f}s",
+                "hardware_online": False,
             }
 
+        text = raw.decode("utf-8", errors="replace").strip()
+        parsed: dict[str, Any] = {}
+        if text.startswith("{") and text.endswith("}"):
+            try:
+                obj = json.loads(text)
+            except json.JSONDecodeError:
+                obj = {}
+            if isinstance(obj, dict):
+                parsed = obj
+
+        ack_status = str(parsed.get("status", text or "ACK")).strip()
+        ack_ok = ack_status.lower() in {"done", "ok", "success", "ack"} or bool(parsed)
+
+        return {
+            "ack": bool(ack_ok),
+            "status": ack_status or "ACK",
+            "raw_ack": text,
+            "protocol": proto,
+            "hardware_online": True,
+            "degraded": False,
+            "ack_payload": parsed,
+            "ack_counts": parsed.get("counts") if isinstance(parsed.get("counts"), list) else [],
+        }
+
+    def _get_serial(self, timeout_s: float) -> Any:
+        """The UART port, opened on first use and kept open across dispenses."""
+        ser = self._serial
+        if ser is None or not ser.is_open:
+            ser = serial.Serial(self._uart_port, self._uart_baud, timeout=timeout_s)  # type: ignore[attr-defined]
+            self._serial = ser
+        return ser
+
+    def _close_serial(self) -> None:
+        ser, self._serial = self._serial, None
+        if ser is not None:
+            try:
+                ser.close()
+            except Exception:
+                pass
+
     def _phase_for_state(self, state: WorkflowState) -> str:
         if state == WorkflowState.WAITING_FOR_USER:
             return "IDLE"
@@ -895,7 +1043,7 @@ class PillDispenserFSM:
 
     def _parse_dose_count(self, value: Any) -> int:
         text = self._clean_text(value)
-        match = re.search(r"(\d+)", text)
+        match = _FIRST_INT_RE.search(text)
         if not match:
             return 1
         try:
@@ -1022,7 +1170,7 @@ class PillDispenserFSM:
 
     def _parse_time_hhmm(self, value: str) -> tuple[int, int] | None:
         text = self._clean_text(value)
-        m = re.fullmatch(r"(\d{1,2}):(\d{2})", text)
+        m = _HHMM_RE.fullmatch(text)
         if not m:
             return None
         hh = int(m.group(1))
@@ -1254,9 +1402,69 @@ class PillDispenserFSM:
         }
         if not entry["user_id"]:
             return
-        serialized = json.dumps(entry, ensure_ascii=True)
-        with self._dispense_log_file.open("a", encoding="utf-8") as fh:
-            fh.write(serialized + "\n")
+        self._append_log_record(self._dispense_log_file, entry, ensure_ascii=True)
+
+    def _append_log_record(self, path: Path, record: dict[str, Any], *, ensure_ascii: bool = False) -> None:
+        if self._log_msgpack:
+            packed = msgpack.packb(record, use_bin_type=True)
+            data = len(packed).to_bytes(4, "big") + packed
+        else:
+            data = (json.dumps(record, ensure_ascii=ensure_ascii) + "\n").encode("utf-8")
+        fh = self._log_handles.get(path)
+        if fh is None:
+            try:
+                fh = path.open("ab", buffering=1 << 16)
+            except FileNotFoundError:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fh = path.open("ab", buffering=1 << 16)
+            self._log_handles[path] = fh
+        fh.write(data)
+        self._unsynced_logs.add(path)
+        self._pending_log_lines += 1
+        if self._pending_log_lines >= LOG_FLUSH_EVERY_LINES:
+            self._flush_logs()
+
+    def _flush_logs(self, *, sync: bool = False) -> None:
+        """
+        Push buffered lines to the OS. With sync=True also fsync, once per log written
+        since the last sync, so every record accumulated in between shares one disk flush.
+        """
+        for fh in self._log_handles.values():
+            try:
+                fh.flush()
+            except OSError:
+                pass
+        self._pending_log_lines = 0
+        if not sync:
+            return
+        for path in self._unsynced_logs:
+            fh = self._log_handles.get(path)
+            if fh is None:
+                continue
+            try:
+                os.fsync(fh.fileno())
+            except OSError:
+                pass
+        self._unsynced_logs.clear()
+
+    def close(self, *, lock_timeout_s: float = -1) -> None:
+        """
+        Flush and close the log handles and the UART port. Also run at interpreter exit,
+        with a lock timeout so a request thread stuck inside the FSM cannot hang shutdown.
+        """
+        if not self._lock.acquire(timeout=lock_timeout_s):
+            return
+        try:
+            self._flush_logs(sync=True)
+            for fh in self._log_handles.values():
+                try:
+                    fh.close()
+                except OSError:
+                    pass
+            self._log_handles.clear()
+            self._close_serial()
+        finally:
+            self._lock.release()
 
     def _try_attach_pending_realsense_embedding(self, user_id: str) -> None:
         path = self._pending_realsense_embedding_file
@@ -1297,9 +1505,16 @@ class PillDispenserFSM:
         return self._response(False, message)
 
     def _maybe_auto_progress(self) -> None:
-        now = self._now()
-        if self._state == WorkflowState.DISPENSING_PILL and self._dispense_stage_ends_at:
-            if now >= self._dispense_stage_ends_at:
+        if (
+            self._dispense_stage_ends_at is None
+            and self._advice_generation_ends_at is None
+            and self._speech_ends_at is None
+            and self._auto_return_at is None
+        ):
+            return  # no timed stage pending (idle / waiting on user input)
+        now_ns = time.monotonic_ns()
+        if self._state == WorkflowState.DISPENSING_PILL and self._dispense_stage_ends_at is not None:
+            if now_ns >= self._dispense_stage_ends_at:
                 self._dispense_stage_ends_at = None
                 # Clear previous advice payload before entering the generation stage so the
                 # frontend cannot briefly render stale advice from an earlier session.
@@ -1311,35 +1526,29 @@ class PillDispenserFSM:
                     WorkflowState.GENERATING_ADVICE,
                     "Dispense completed. Preparing health advice.",
                 )
-                self._advice_generation_ends_at = now + timedelta(
-                    seconds=self._advice_generation_seconds
-                )
+                self._advice_generation_ends_at = self._deadline_in(self._advice_generation_seconds)
 
-        if self._state == WorkflowState.GENERATING_ADVICE and self._advice_generation_ends_at:
-            if now >= self._advice_generation_ends_at:
+        if self._state == WorkflowState.GENERATING_ADVICE and self._advice_generation_ends_at is not None:
+            if now_ns >= self._advice_generation_ends_at:
                 self._advice_generation_ends_at = None
                 profile = self._active_user_profile or {}
                 self._advice_text = self._generate_health_advice(profile)
                 self._is_speaking = self._speak_advice(self._advice_text)
-                self._speech_ends_at = now + timedelta(
-                    seconds=self._estimate_advice_speech_seconds()
-                )
+                self._speech_ends_at = self._deadline_in(self._estimate_advice_speech_seconds())
                 self._transition(
                     WorkflowState.SPEAKING_ADVICE,
                     "Health advice ready and speaking has started.",
                 )
 
-        if self._state == WorkflowState.SPEAKING_ADVICE and self._speech_ends_at:
-            if now >= self._speech_ends_at:
+        if self._state == WorkflowState.SPEAKING_ADVICE and self._speech_ends_at is not None:
+            if now_ns >= self._speech_ends_at:
                 self._is_speaking = False
                 self._speech_ends_at = None
                 self._transition(
                     WorkflowState.SESSION_SUCCESS,
                     "Advice playback finished. Session complete.",
                 )
-                self._auto_return_at = now + timedelta(
-                    seconds=self._success_display_seconds
-                )
+                self._auto_return_at = self._deadline_in(self._success_display_seconds)
                 self._finalize_session_record(
                     result="SESSION_SUCCESS",
                     note="Advice playback completed.",
@@ -1348,8 +1557,8 @@ class PillDispenserFSM:
         if self._state in {
             WorkflowState.REGISTRATION_SUCCESS,
             WorkflowState.SESSION_SUCCESS,
-        } and self._auto_return_at:
-            if now >= self._auto_return_at:
+        } and self._auto_return_at is not None:
+            if now_ns >= self._auto_return_at:
                 self._clear_runtime_context(clear_error=True)
                 self._transition(
                     WorkflowState.WAITING_FOR_USER,
@@ -1370,33 +1579,57 @@ class PillDispenserFSM:
         if not user_id:
             raise ValueError("Invalid user id.")
         out_file = self._users_dir / f"{user_id}.json"
-        out_file.write_text(json.dumps(profile, indent=2), encoding="utf-8")
+        write_file_atomic(out_file, json.dumps(profile, indent=2).encode("utf-8"), durable=True)
+        self._profile_generation += 1
+
+    def _cached_user_profiles(self) -> dict[str, tuple[dict[str, Any], float]]:
+        """
+        Parsed data/users/*.json keyed by file stem, in filename order, with each file's mtime.
+        Re-scanned when any profile file is added, removed or rewritten (per-file mtime and
+        size, so in-place rewrites by the Windows rename fallback are seen too) or after this
+        FSM saves a profile. Callers must not mutate entries.
+        """
+        key = (self._users_dir_fingerprint(), self._profile_generation)
+        cached_key, cached = self._profile_cache
+        if cached_key == key:
+            return cached
+        profiles: dict[str, tuple[dict[str, Any], float]] = {}
+        for user_file in sorted(self._users_dir.glob("*.json")):
+            try:
+                data = json_loads(user_file.read_bytes())
+                mtime = user_file.stat().st_mtime
+            except (json.JSONDecodeError, OSError):
+                continue
+            if isinstance(data, dict):
+                profiles[user_file.stem] = (data, mtime)
+        self._profile_cache = (key, profiles)
+        return profiles
+
+    def _users_dir_fingerprint(self) -> tuple[tuple[str, int, int], ...] | None:
+        try:
+            with os.scandir(self._users_dir) as entries:
+                return tuple(
+                    sorted(
+                        (entry.name, st.st_mtime_ns, st.st_size)
+                        for entry in entries
+                        if entry.name.endswith(".json")
+                        for st in (entry.stat(),)
+                    )
+                )
+        except OSError:
+            return None
 
     def _load_user_profile(self, user_id: str) -> dict[str, Any] | None:
         safe_id = self._safe_user_id(user_id)
         if not safe_id:
             return None
-        in_file = self._users_dir / f"{safe_id}.json"
-        if not in_file.exists():
-            return None
-        try:
-            data = json.loads(in_file.read_text(encoding="utf-8"))
-        except json.JSONDecodeError:
-            return None
-        if not isinstance(data, dict):
-            return None
-        return data
+        cached = self._cached_user_profiles().get(safe_id)
+        return copy.deepcopy(cached[0]) if cached is not None else None
 
     def _list_known_users(self) -> list[dict[str, str]]:
         users: list[dict[str, str]] = []
-        for user_file in sorted(self._users_dir.glob("*.json")):
-            try:
-                data = json.loads(user_file.read_text(encoding="utf-8"))
-            except json.JSONDecodeError:
-                continue
-            if not isinstance(data, dict):
-                continue
-            user_id = self._safe_user_id(str(data.get("id", user_file.stem)))
+        for stem, (data, _) in self._cached_user_profiles().items():
+            user_id = self._safe_user_id(str(data.get("id", stem)))
             if not user_id:
                 continue
             users.append(
@@ -1412,69 +1645,74 @@ class PillDispenserFSM:
     def _canonical_name_key(self, value: Any) -> str:
         return self._clean_text(value).casefold()
 
+    def _profiles_by_name(self) -> dict[str, tuple[str, dict[str, Any]]]:
+        """Canonical name -> (user id, newest profile with that name), rebuilt when the profile cache is."""
+        profiles = self._cached_user_profiles()
+        built_from, index = self._name_index
+        if built_from is profiles:
+            return index
+        best: dict[str, tuple[tuple[str, float], str, dict[str, Any]]] = {}
+        for stem, (data, mtime) in profiles.items():
+            name_key = self._canonical_name_key(data.get("name", ""))
+            if not name_key:
+                continue
+            user_id = self._safe_user_id(str(data.get("id", stem)))
+            if not user_id:
+                continue
+            sort_key = (str(data.get("updated_at") or data.get("created_at") or ""), float(mtime))
+            current = best.get(name_key)
+            if current is None or sort_key > current[0]:
+                best[name_key] = (sort_key, user_id, data)
+        index = {name_key: (user_id, data) for name_key, (_, user_id, data) in best.items()}
+        self._name_index = (profiles, index)
+        return index
+
     def _find_existing_user_profile_by_name(self, name: str) -> dict[str, Any] | None:
         target_key = self._canonical_name_key(name)
         if not target_key:
             return None
-
-        best_profile: dict[str, Any] | None = None
-        best_sort_key: tuple[str, float] = ("", -1.0)
-        for user_file in self._users_dir.glob("*.json"):
-            try:
-                data = json.loads(user_file.read_text(encoding="utf-8"))
-            except json.JSONDecodeError:
-                continue
-            if not isinstance(data, dict):
-                continue
-            if self._canonical_name_key(data.get("name", "")) != target_key:
-                continue
-            user_id = self._safe_user_id(str(data.get("id", user_file.stem)))
-            if not user_id:
-                continue
-            sort_ts = str(data.get("updated_at") or data.get("created_at") or "")
-            try:
-                mtime = user_file.stat().st_mtime
-            except OSError:
-                mtime = -1.0
-            candidate_key = (sort_ts, float(mtime))
-            if best_profile is None or candidate_key > best_sort_key:
-                data["id"] = user_id
-                best_profile = data
-                best_sort_key = candidate_key
+        found = self._profiles_by_name().get(target_key)
+        if found is None:
+            return None
+        best_profile = copy.deepcopy(found[1])
+        best_profile["id"] = found[0]
         return best_profile
 
     def _save_face_photo(self, user_id: str, photo_data_url: str) -> Path:
-        if "," not in photo_data_url:
+        comma = photo_data_url.find(",", 0, 256)
+        if comma < 0:
             raise ValueError("Invalid image payload.")
-        header, encoded = photo_data_url.split(",", 1)
+        # Validate the short header before slicing out the (large) base64 body.
+        header = photo_data_url[:comma]
         if "base64" not in header:
             raise ValueError("Image payload must be base64 encoded.")
         if not header.startswith("data:image/"):
             raise ValueError("Image payload must be an image.")
         try:
-            image_bytes = base64.b64decode(encoded, validate=True)
-        except ValueError as exc:
+            # One ASCII encode, then decode straight from a view of the body.
+            raw = photo_data_url.encode("ascii")
+            image_bytes = _b64decode_strict(memoryview(raw)[comma + 1:])
+        except ValueError as exc:  # binascii.Error and UnicodeEncodeError are ValueErrors
             raise ValueError("Could not decode image payload.") from exc
         if not image_bytes:
             raise ValueError("Image payload is empty.")
 
         out_file = self._faces_dir / f"{user_id}.jpg"
-        out_file.write_bytes(image_bytes)
+        _write_bytes_creating_parent(out_file, image_bytes)
         return out_file
 
     def _build_user_id(self, name: str) -> str:
-        slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+        slug = _SLUG_SEPARATOR_RE.sub("-", name.lower()).strip("-")
         if not slug:
             slug = "user"
-        timestamp = self._now().strftime("%Y%m%d%H%M%S")
+        timestamp = _compact_stamp(self._now())
         return f"{slug}-{timestamp}"
 
     def _safe_user_id(self, value: str) -> str:
-        return re.sub(r"[^a-zA-Z0-9_-]", "", str(value)).strip()
+        return _UNSAFE_ID_CHARS_RE.sub("", str(value)).strip()
 
     def _clean_text(self, value: Any) -> str:
-        text = str(value or "").strip()
-        return re.sub(r"\s+", " ", text)
+        return " ".join(str(value or "").split())
 
     def _clear_runtime_context(self, clear_error: bool) -> None:
         self._current_distance_m = None
@@ -1519,7 +1757,7 @@ class PillDispenserFSM:
     def _start_session_context(self) -> None:
         now = self._now()
         self._session_context = {
-            "session_id": f"sess-{now.strftime('%Y%m%d%H%M%S%f')}",
+            "session_id": f"sess-{_compact_stamp(now, micros=True)}",
             "started_at": now.isoformat(),
             "finalized": False,
             "user_id": "",
@@ -1566,19 +1804,22 @@ class PillDispenserFSM:
         self._last_session_summary = summary
         self._session_context["finalized"] = True
         try:
-            with self._session_log_file.open("a", encoding="utf-8") as fh:
-                fh.write(json.dumps(summary, ensure_ascii=False) + "\n")
+            self._append_log_record(self._session_log_file, summary)
+            self._flush_logs(sync=True)
         except OSError:
             pass
 
-    def _seconds_until(self, when: datetime | None, now: datetime) -> int | None:
+    def _deadline_in(self, seconds: float) -> int:
+        # Stage deadlines use the monotonic clock so NTP/wall-clock steps cannot stall or skip a stage.
+        return time.monotonic_ns() + int(seconds * 1_000_000_000)
+
+    def _seconds_until(self, when: int | None, now_ns: int) -> int | None:
         if when is None:
             return None
-        delta = int((when - now).total_seconds())
-        return max(0, delta)
+        return max(0, (when - now_ns) // 1_000_000_000)
 
-    def _snapshot(self) -> dict:
-        now = self._now()
+    def _snapshot(self, *, include_users: bool = True) -> dict:
+        now_ns = time.monotonic_ns()
         active_user = None
         if self._active_user_profile:
             active_user = {
@@ -1609,11 +1850,11 @@ class PillDispenserFSM:
             "advice_text": self._advice_text,
             "last_advice_payload": self._last_advice_payload,
             "is_speaking": self._is_speaking,
-            "speech_seconds_remaining": self._seconds_until(self._speech_ends_at, now),
-            "auto_return_seconds": self._seconds_until(self._auto_return_at, now),
-            "dispense_seconds_remaining": self._seconds_until(self._dispense_stage_ends_at, now),
-            "advice_generation_seconds_remaining": self._seconds_until(self._advice_generation_ends_at, now),
-            "known_users": self._list_known_users(),
+            "speech_seconds_remaining": self._seconds_until(self._speech_ends_at, now_ns),
+            "auto_return_seconds": self._seconds_until(self._auto_return_at, now_ns),
+            "dispense_seconds_remaining": self._seconds_until(self._dispense_stage_ends_at, now_ns),
+            "advice_generation_seconds_remaining": self._seconds_until(self._advice_generation_ends_at, now_ns),
+            "known_users": self._list_known_users() if include_users else [],
             "can_start_monitoring": self._state == WorkflowState.WAITING_FOR_USER,
             "can_submit_distance": self._state == WorkflowState.MONITORING_DISTANCE,
             "can_choose_recognition": self._state == WorkflowState.FACE_RECOGNITION,
@@ -1621,7 +1862,7 @@ class PillDispenserFSM:
             "can_stop_advice": self._state == WorkflowState.SPEAKING_ADVICE,
             "manual_override_available": bool(self._manual_override_available),
             "can_reset": self._state != WorkflowState.WAITING_FOR_USER,
-            "history": self._history[-30:],
+            "history": list(itertools.islice(self._history, max(0, len(self._history) - 30), None)),
             "session_context": self._session_context,
             "last_session_summary": self._last_session_summary,
             "hardware_degrade_mode": bool(self._uart_offline_fallback),
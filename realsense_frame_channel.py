@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+FRAME_CHANNEL_NAME = "medrem_frame"
+FRAME_CHANNEL_MAX_JPEG = 1 << 20
+META_CHANNEL_NAME = "medrem_meta"
+META_CHANNEL_MAX_BYTES = 1 << 16
+
+# Header: seqlock word, then (active slot, payload length). Slots follow at _HEADER_SIZE.
+# The seqlock word is odd while the header is being rewritten; payload seq = word >> 1.
+# There are no explicit memory barriers: both sides use plain struct stores/loads and
+# rely on CPython (under the GIL) issuing each pack_into as one complete copy, in
+# program order. A reader that races the writer is caught by re-checking the word
+# after its copy and retries; it never returns a torn payload.
+_SEQ = struct.Struct("<Q")
+_SLOT = struct.Struct("<QQ")
+_HEADER_SIZE = 64
+
+
+def _segment_size(max_payload: int) -> int:
+    return _HEADER_SIZE + 2 * max_payload
+
+
+class FrameChannelWriter:
+    """
+    Publishes JPEG frames (or any bytes payload, e.g. the meta JSON) through a
+    double-buffered shared-memory segment.
+
+    Each publish writes into the slot readers are *not* looking at, then flips the
+    header under a seqlock. A reader accepts a copy only if the seqlock word was even
+    and unchanged across the copy, so no cross-process lock is needed.
+    """
+
+    def __init__(self, name: str = FRAME_CHANNEL_NAME, *, max_payload: int = FRAME_CHANNEL_MAX_JPEG) -> None:
+        self.max_payload = int(max_payload)
+        size = _segment_size(self.max_payload)
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a crashed writer; start a fresh segment so stale readers re-attach.
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._buf = self._shm.buf
+        self._seq = 0
+        _SEQ.pack_into(self._buf, 0, 0)
+        _SLOT.pack_into(self._buf, _SEQ.size, 0, 0)
+
+    def publish(self, payload) -> bool:
+        """Copy one payload into the channel. Returns False if it does not fit."""
+        length = len(payload)
+        if length == 0 or length > self.max_payload:
+            return False
+        seq = self._seq + 1
+        slot = seq & 1
+        start = _HEADER_SIZE + slot * self.max_payload
+        self._buf[start:start + length] = memoryview(payload).cast("B")
+        _SEQ.pack_into(self._buf, 0, 2 * seq - 1)
+        _SLOT.pack_into(self._buf, _SEQ.size, slot, length)
+        _SEQ.pack_into(self._buf, 0, 2 * seq)
+        self._seq = seq
+        return True
+
+    def close(self) -> None:
+        shm = getattr(self, "_shm", None)
+        if shm is None:
+            return
+        self._shm = None
+        self._buf = None
+        try:
+            shm.close()
+            shm.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
+
+
+class FrameChannelReader:
+    """
+    Attaches to a FrameChannelWriter segment. Attach is lazy and retried, so the
+    reader may be created before the writer process starts.
+
+    One reader may be shared by threaded request handlers: attach, detach and the
+    payload copy all run under one lock, so a stale-segment detach cannot close the
+    mapping while another thread is reading from it.
+    """
+
+    def __init__(
+        self,
+        name: str = FRAME_CHANNEL_NAME,
+        *,
+        max_payload: int = FRAME_CHANNEL_MAX_JPEG,
+        stale_after_s: float = 2.0,
+    ) -> None:
+        self.name = name
+        self.max_payload = int(max_payload)
+        self.stale_after_s = float(stale_after_s)
+        self._shm: shared_memory.SharedMemory | None = None
+        self._last_seq = 0
+        self._last_seq_change = 0.0
+        self._next_attach_at = 0.0
+        self._lock = threading.Lock()
+
+    def _attach(self) -> bool:
+        if self._shm is not None:
+            return True
+        now = time.monotonic()
+        if now < self._next_attach_at:
+            return False
+        self._next_attach_at = now + 0.5
+        try:
+            shm = _attach_untracked(self.name)
+        except (FileNotFoundError, OSError, ValueError):
+            return False
+        if shm.size < _segment_size(self.max_payload):
+            shm.close()
+            return False
+        self._shm = shm
+        self._last_seq = 0
+        self._last_seq_change = now
+        return True
+
+    def _detach(self) -> None:
+        shm, self._shm = self._shm, None
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                pass
+
+    def available(self) -> bool:
+        with self._lock:
+            return self._attach()
+
+    def seq(self) -> int | None:
+        """Current payload sequence number, or None when no writer is attached."""
+        with self._lock:
+            return self._seq_locked()
+
+    def _seq_locked(self) -> int | None:
+        if not self._attach():
+            return None
+        seq = _SEQ.unpack_from(self._shm.buf, 0)[0] >> 1
+        now = time.monotonic()
+        if seq != self._last_seq:
+            self._last_seq = seq
+            self._last_seq_change = now
+        elif (now - self._last_seq_change) > self.stale_after_s:
+            # Writer may have restarted under a new segment; drop ours and re-attach.
+            self._detach()
+            return None
+        return seq
+
+    def read(self, *, retries: int = 3) -> tuple[int, bytes] | None:
+        """Return (seq, payload_bytes) for the latest complete payload, or None."""
+        with self._lock:
+            if self._seq_locked() is None:
+                return None
+            try:
+                return self._read_locked(self._shm.buf, retries)
+            except ValueError:  # released buffer; report no frame rather than fail the request
+                self._detach()
+                return None
+
+    def _read_locked(self, buf: memoryview, retries: int) -> tuple[int, bytes] | None:
+        for _ in range(max(1, retries)):
+            word = _SEQ.unpack_from(buf, 0)[0]
+            if word & 1:
+                time.sleep(0)  # writer mid-update; yield and retry
+                continue
+            slot, length = _SLOT.unpack_from(buf, _SEQ.size)
+            if word == 0 or length == 0 or length > self.max_payload or slot > 1:
+                return None
+            start = _HEADER_SIZE + slot * self.max_payload
+            data = bytes(buf[start:start + length])
+            if _SEQ.unpack_from(buf, 0)[0] == word:
+                return word >> 1, data
+        return None
+
+    def close(self) -> None:
+        with self._lock:
+            self._detach()
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach without letting this process's resource tracker unlink the writer's
+    segment on exit (Python < 3.13 registers attached segments too).
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    except Exception:
+        pass
+    return shm
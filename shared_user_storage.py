@@ -1,11 +1,69 @@
 from __future__ import annotations
 
 import json
+import os
 import re
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional fast JSON codec
+    orjson = None
+
+LEGACY_CACHE_MARKER = "shared_user_storage"
+
+
+def json_loads(raw: bytes) -> Any:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch either.
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps_pretty(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+    return json.dumps(payload, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def _write_fd(path: str, data, *, fsync: bool = False) -> None:
+    """Unbuffered whole-buffer write: one open, write(s), close; no Python file object."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        view = memoryview(data).cast("B")
+        while view:
+            view = view[os.write(fd, view):]
+        if fsync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_file_atomic(path: str | os.PathLike[str], data, *, durable: bool = False) -> None:
+    """
+    Write any bytes-like `data` via a sibling `.tmp` + os.replace so concurrent readers
+    never parse a torn file. durable=True fsyncs the tmp file first, so a power cut
+    leaves the old or the new contents. A missing parent directory is created.
+    """
+    path = os.fspath(path)
+    tmp = path + ".tmp"
+    try:
+        _write_fd(tmp, data, fsync=durable)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _write_fd(tmp, data, fsync=durable)
+    try:
+        os.replace(tmp, path)
+    except PermissionError:
+        # Windows: a reader holding the target open blocks the rename.
+        _write_fd(path, data)
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
 
 class SharedUserStorage:
     """
@@ -65,7 +123,7 @@ class SharedUserStorage:
         if not path.exists():
             return None
         try:
-            data = json.loads(path.read_text(encoding="utf-8"))
+            data = json_loads(path.read_bytes())
         except json.JSONDecodeError:
             return None
         return data if isinstance(data, dict) else None
@@ -73,14 +131,14 @@ class SharedUserStorage:
     def save_profile(self, profile: dict[str, Any]) -> dict[str, Any]:
         normalized = self.normalize_profile(profile)
         path = self._profile_path(normalized["id"])
-        path.write_text(json.dumps(normalized, indent=2, ensure_ascii=False), encoding="utf-8")
+        write_file_atomic(path, _json_dumps_pretty(normalized))
         return normalized
 
     def list_profiles(self) -> list[dict[str, Any]]:
         profiles: list[dict[str, Any]] = []
         for user_file in sorted(self.users_dir.glob("*.json")):
             try:
-                data = json.loads(user_file.read_text(encoding="utf-8"))
+                data = json_loads(user_file.read_bytes())
             except json.JSONDecodeError:
                 continue
             if not isinstance(data, dict):
@@ -162,7 +220,7 @@ class SharedUserStorage:
         if not path.exists():
             return None
         try:
-            data = json.loads(path.read_text(encoding="utf-8"))
+            data = json_loads(path.read_bytes())
         except json.JSONDecodeError:
             return None
         if not isinstance(data, dict):
@@ -199,7 +257,7 @@ class SharedUserStorage:
             "updated_at": self._now_iso(),
         }
         path = self._embedding_path(safe_id)
-        path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+        write_file_atomic(path, _json_dumps_pretty(payload))
 
         profile = self.load_profile(safe_id)
         if profile:
@@ -235,11 +293,15 @@ class SharedUserStorage:
         if not self.legacy_users_file.exists():
             return 0
         try:
-            raw = json.loads(self.legacy_users_file.read_text(encoding="utf-8"))
+            raw = json_loads(self.legacy_users_file.read_bytes())
         except json.JSONDecodeError:
             return 0
         if not isinstance(raw, dict):
             return 0
+        if raw.get("generated_by") == LEGACY_CACHE_MARKER:
+            # Our own cache of canonical storage; re-importing would only rewrite
+            # every profile/embedding and bump their mtimes.
+            return 0
         legacy_users = raw.get("users")
         if not isinstance(legacy_users, list):
             return 0
@@ -300,10 +362,16 @@ class SharedUserStorage:
             self.write_legacy_users_cache(import_legacy=False)
         return imported
 
-    def list_realsense_users(self, *, import_legacy: bool = True) -> list[dict[str, Any]]:
+    def list_realsense_users(
+        self,
+        *,
+        import_legacy: bool = True,
+        include_embeddings: bool = True,
+    ) -> list[dict[str, Any]]:
         """
         RealSense compatibility view. Keeps old keys (`face_encoding`, `medications`)
-        while sourcing from canonical per-user files.
+        while sourcing from canonical per-user files. With include_embeddings=False the
+        per-user embedding files are not read and `face_encoding` is omitted.
         """
         if import_legacy:
             self.import_legacy_users_json()
@@ -333,9 +401,10 @@ class SharedUserStorage:
                 "medications": medications,
                 "created": str(profile.get("created_at", self._now_iso())),
             }
-            embedding = self.load_embedding(user_id)
-            if embedding:
-                entry["face_encoding"] = embedding
+            if include_embeddings:
+                embedding = self.load_embedding(user_id)
+                if embedding:
+                    entry["face_encoding"] = embedding
             out.append(entry)
         return out
 
@@ -406,7 +475,8 @@ class SharedUserStorage:
     def write_legacy_users_cache(self, *, import_legacy: bool = True) -> None:
         if import_legacy:
             self.import_legacy_users_json()
-        cache = {"users": self.list_realsense_users(import_legacy=False)}
-        self.legacy_users_file.write_text(
-            json.dumps(cache, indent=2, ensure_ascii=False), encoding="utf-8"
-        )
+        cache = {
+            "generated_by": LEGACY_CACHE_MARKER,
+            "users": self.list_realsense_users(import_legacy=False),
+        }
+        write_file_atomic(self.legacy_users_file, _json_dumps_pretty(cache))
@@ -0,0 +1,129 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import face_med_reminder as fmr
+except ImportError:  # cv2 / pyrealsense2 / insightface only exist on the Jetson image
+    fmr = None
+
+
+def _unit_rows(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((n, dim)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+@unittest.skipIf(fmr is None, "vision dependencies not installed")
+class FaceGalleryTest(unittest.TestCase):
+    def setUp(self):
+        self.bank = _unit_rows(4, fmr.EMBEDDING_DIM)
+        self.users = [{"id": f"u{i}", "name": f"User {i}"} for i in range(4)]
+        # Query close to row 2, so row 2 must score highest.
+        noise = _unit_rows(1, fmr.EMBEDDING_DIM, seed=1)[0]
+        query = self.bank[2] + 0.3 * noise
+        self.query = query / np.linalg.norm(query)
+
+    def test_float_scores_match_cosine(self):
+        gallery = fmr.FaceGallery.build(self.bank, range(4))
+        np.testing.assert_allclose(gallery.scores(self.query), self.bank @ self.query, atol=1e-5)
+
+    def test_float16_rows_score_like_float32(self):
+        gallery = fmr.FaceGallery.build(self.bank.astype(np.float16), range(4))
+        scores = np.asarray(gallery.scores(self.query), dtype=np.float32)
+        np.testing.assert_allclose(scores, self.bank @ self.query, atol=2e-3)
+        self.assertEqual(int(scores.argmax()), 2)
+
+    def test_int8_scores_track_float_scores(self):
+        gallery = fmr.FaceGallery.build(self.bank.astype(np.float16), range(4), quantize=True)
+        self.assertEqual(gallery.q8.dtype, np.int8)
+        scores = np.asarray(gallery.scores(self.query), dtype=np.float32)
+        np.testing.assert_allclose(scores, self.bank @ self.query, atol=2e-2)
+        self.assertEqual(int(scores.argmax()), 2)
+
+    def test_append_quantizes_new_row(self):
+        gallery = fmr.FaceGallery.build(self.bank[:3], [0, 1, 2], quantize=True)
+        gallery.append(self.bank[3], 7)
+        self.assertEqual((len(gallery), gallery.q8.shape[0], gallery.q8_scale.shape[0]), (4, 4, 4))
+        self.assertEqual(int(gallery.user_idx[-1]), 7)
+        self.assertEqual(int(np.asarray(gallery.scores(self.bank[3])).argmax()), 3)
+
+    def test_find_matching_user_applies_threshold(self):
+        for quantize in (False, True):
+            gallery = fmr.FaceGallery.build(self.bank, range(4), quantize=quantize)
+            data = {"users": self.users}
+            user, idx, score = fmr.find_matching_user(self.query, data, gallery=gallery)
+            self.assertEqual((user["id"], idx), ("u2", 2))
+            self.assertGreaterEqual(score, fmr.MATCH_THRESHOLD)
+
+            # Orthogonal to every stored row: best score is ~0, below the threshold.
+            stranger = np.linalg.svd(self.bank, full_matrices=True)[2][-1]
+            user, idx, score = fmr.find_matching_user(stranger, data, gallery=gallery)
+            self.assertIsNone(user)
+            self.assertEqual(idx, -1)
+            self.assertLess(score, fmr.MATCH_THRESHOLD)
+
+
+@unittest.skipIf(fmr is None, "vision dependencies not installed")
+class EmbeddingBankSignatureTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        tmp = Path(self._tmp.name)
+        self.vision = object.__new__(fmr.MedReminderVision)
+        self.vision.bank_file = tmp / "bank.npy"
+        self.vision.bank_ids_file = tmp / "bank_ids.json"
+        self.vecs = _unit_rows(2, fmr.EMBEDDING_DIM)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _users(self, *, with_encodings):
+        users = [{"id": "ann-1"}, {"id": "legacy"}, {"id": "bob-2"}]
+        if with_encodings:
+            users[0]["face_encoding"] = (3.0 * self.vecs[0]).tolist()  # stored unnormalized
+            users[1]["face_encoding"] = [0.1] * 128  # old 128-d encoding is left out
+            users[2]["face_encoding"] = self.vecs[1].tolist()
+        return users
+
+    def test_saved_bank_reused_only_for_same_signature(self):
+        sig = (3, 1_700_000_000_000_000_000)
+        built = self.vision._rebuild_embedding_cache(self._users(with_encodings=True), sig)
+        self.assertEqual(built.shape, (2, fmr.EMBEDDING_DIM))
+
+        # A restart with the same store signature maps rows by id without any face_encoding.
+        users = self._users(with_encodings=False)
+        bank = self.vision._load_saved_embedding_bank(users, sig)
+        self.assertIsNotNone(bank)
+        self.assertEqual([u.get("_emb_row") for u in users], [0, None, 1])
+        self.assertEqual(bank.dtype, np.float16)
+        np.testing.assert_allclose(np.asarray(bank, dtype=np.float32), self.vecs, atol=1e-3)
+
+        for stale in ((4, sig[1]), (3, sig[1] + 1)):
+            self.assertIsNone(self.vision._load_saved_embedding_bank(self._users(with_encodings=False), stale))
+
+
+@unittest.skipIf(fmr is None, "vision dependencies not installed")
+class MedianDepthsAtTest(unittest.TestCase):
+    def test_per_face_medians_in_one_call(self):
+        depth = np.zeros((40, 40), dtype=np.uint16)
+        depth[0:10, 0:10] = 800                   # fully valid window
+        depth[20:30, 20:30] = 1200
+        depth[20:30, 20:25] = 0                   # half the window has no depth data
+        depth[36, 36], depth[38, 38] = 1000, 1600 # two valid pixels: mean of the middle pair
+        depth[12, 12] = 3000                      # out of range (>= 2 m) counts as missing
+
+        got = fmr.median_depths_at(depth, [4, 25, 37, 12], [4, 25, 37, 12], k=5, depth_scale=0.001)
+        np.testing.assert_allclose(got, [0.8, 1.2, 1.3, 0.0], atol=1e-6)
+
+    def test_window_is_clamped_at_border(self):
+        depth = np.full((10, 10), 1000, dtype=np.uint16)
+        depth[0, 0:2] = 500
+        got = fmr.median_depths_at(depth, [0], [0], k=3, depth_scale=0.001)
+        # Clamping repeats the edge pixels: six reads of 0.5 m and three of 1.0 m.
+        np.testing.assert_allclose(got, [0.5], atol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pill_dispenser_fsm
+from pill_dispenser_fsm import PillDispenserFSM, _compact_stamp, read_log_records
+
+
+def _log_writer(*, use_msgpack: bool) -> PillDispenserFSM:
+    """FSM shell with only the log-writer state, so no data dirs are created."""
+    fsm = object.__new__(PillDispenserFSM)
+    fsm._log_msgpack = use_msgpack
+    fsm._log_handles = {}
+    fsm._unsynced_logs = set()
+    fsm._pending_log_lines = 0
+    return fsm
+
+
+def _write_records(path: Path, records: list[dict], *, use_msgpack: bool) -> None:
+    fsm = _log_writer(use_msgpack=use_msgpack)
+    for record in records:
+        fsm._append_log_record(path, record)
+    fsm._flush_logs()
+    for fh in fsm._log_handles.values():
+        fh.close()
+
+
+RECORDS = [
+    {"timestamp": "2026-03-04T05:06:07+00:00", "user_id": "ann-1", "result": "SUCCESS"},
+    {"timestamp": "2026-03-04T05:07:00+00:00", "note": "Zoë", "channel_counts": [1, 0, 2, 0]},
+]
+
+
+class CompactStampTest(unittest.TestCase):
+    def test_matches_strftime(self):
+        for dt in (
+            datetime(2026, 3, 4, 5, 6, 7, 89, tzinfo=timezone.utc),
+            datetime(2026, 12, 31, 23, 59, 59, 999999),
+        ):
+            self.assertEqual(_compact_stamp(dt), dt.strftime("%Y%m%d%H%M%S"))
+            self.assertEqual(_compact_stamp(dt, micros=True), dt.strftime("%Y%m%d%H%M%S%f"))
+
+
+class ReadLogRecordsTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_jsonl_round_trip_skips_torn_line(self):
+        path = self.tmp / "dispense_log.jsonl"
+        _write_records(path, RECORDS, use_msgpack=False)
+        with path.open("ab") as fh:
+            fh.write(b'{"timestamp": "2026-03-04T05')
+        self.assertEqual(list(read_log_records(path)), RECORDS)
+
+    @unittest.skipIf(pill_dispenser_fsm.msgpack is None, "msgpack not installed")
+    def test_msgpack_frames_are_length_prefixed(self):
+        path = self.tmp / "dispense_log.msgpack"
+        _write_records(path, RECORDS, use_msgpack=True)
+        raw = path.read_bytes()
+        first_len = int.from_bytes(raw[:4], "big")
+        self.assertEqual(pill_dispenser_fsm.msgpack.unpackb(raw[4:4 + first_len], raw=False), RECORDS[0])
+
+    @unittest.skipIf(pill_dispenser_fsm.msgpack is None, "msgpack not installed")
+    def test_msgpack_round_trip_skips_torn_frame(self):
+        path = self.tmp / "dispense_log.msgpack"
+        _write_records(path, RECORDS, use_msgpack=True)
+        with path.open("ab") as fh:
+            fh.write((100).to_bytes(4, "big") + b"\x81")
+        self.assertEqual(list(read_log_records(path)), RECORDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from shared_user_storage import write_file_atomic
+
+
+class WriteFileAtomicTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_replaces_contents_and_leaves_no_tmp(self):
+        path = self.tmp / "users" / "ann-1.json"  # parent does not exist yet
+        for durable in (False, True):
+            data = b'{"durable": %d}' % durable
+            write_file_atomic(path, data, durable=durable)
+            self.assertEqual(path.read_bytes(), data)
+        self.assertEqual(os.listdir(path.parent), ["ann-1.json"])
+
+    def test_accepts_str_path_and_buffer_objects(self):
+        path = str(self.tmp / "frame.jpg")
+        write_file_atomic(path, memoryview(bytearray(b"\xff\xd8jpeg\xff\xd9")))
+        self.assertEqual(Path(path).read_bytes(), b"\xff\xd8jpeg\xff\xd9")
+
+
+if __name__ == "__main__":
+    unittest.main()